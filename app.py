@@ -1,17 +1,85 @@
-from flask import Flask, redirect, url_for, session, request, send_file
+import time
+_BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, redirect, url_for, session, request, send_file, g, jsonify, has_request_context, make_response
+from markupsafe import escape
 import io
+import zipfile
 import os
+import sys
+import json
+import queue
+import threading
 import sqlite3
 import datetime as dt
 import uuid
 import hashlib
-import pandas as pd
+import math
+import unicodedata
+from functools import lru_cache
+from collections import OrderedDict
+from itertools import groupby
+from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait as wait_futures
+import re
+import urllib.parse
+import click
 
 app = Flask(__name__)
 app.secret_key = "dev-secret-change-later"
+app.logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
 DB_PATH = "data.db"
 
+# Conexões ociosas guardadas por worker (0 = sem pool, fecha no fim do request)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "0"))
+
+# Requests com esses métodos usam conexão somente leitura (mode=ro + query_only)
+READ_ONLY_METHODS = {"GET", "HEAD"}
+
+# Linhas por executemany ao gravar imports grandes
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "2000"))
+
+# Previews não confirmados são apagados depois desse prazo
+PREVIEW_TTL_HOURS = float(os.environ.get("PREVIEW_TTL_HOURS", "24"))
+# Intervalo mínimo entre duas varreduras no mesmo worker
+PREVIEW_SWEEP_INTERVAL_SECONDS = int(os.environ.get("PREVIEW_SWEEP_INTERVAL_SECONDS", "600"))
+
+# Imports em background: threads por worker e quantos jobs podem esperar na fila
+IMPORT_MAX_WORKERS = int(os.environ.get("IMPORT_MAX_WORKERS", "1"))
+IMPORT_MAX_PENDING = int(os.environ.get("IMPORT_MAX_PENDING", "4"))
+# Quanto o request espera o job antes de responder com a tela de progresso
+IMPORT_INLINE_WAIT_SECONDS = float(os.environ.get("IMPORT_INLINE_WAIT_SECONDS", "2"))
+# Job em andamento sem atualização há mais que isso (e que não roda neste worker)
+# é dado como morto: o worker que rodava reiniciou
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get("IMPORT_JOB_STALE_SECONDS", "900"))
+
+# Possível duplicado entre perfis: mesmo mês e valor, datas próximas e descrição parecida
+MATCH_DATE_WINDOW_DAYS = int(os.environ.get("MATCH_DATE_WINDOW_DAYS", "3"))
+MATCH_MIN_SIMILARITY = float(os.environ.get("MATCH_MIN_SIMILARITY", "0.6"))
+
+# Processos para ler/validar planilhas no import em lote (0 = número de CPUs)
+BULK_IMPORT_PROCESSES = int(os.environ.get("BULK_IMPORT_PROCESSES", "0"))
+
+# Perfil de conexão, aplicado em toda conexão aberta.
+# WAL deixa leitores rodando enquanto outro worker grava um import grande.
+DB_PRAGMAS = {
+    "journal_mode": os.environ.get("DB_JOURNAL_MODE", "WAL").upper(),
+    "synchronous": os.environ.get("DB_SYNCHRONOUS", "NORMAL").upper(),
+    "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.environ.get("DB_CACHE_SIZE", "-16000")),  # negativo = KiB
+    "mmap_size": int(os.environ.get("DB_MMAP_SIZE", str(128 * 1024 * 1024))),
+    "temp_store": os.environ.get("DB_TEMP_STORE", "MEMORY").upper(),
+}
+ALLOWED_PRAGMA_VALUES = {
+    "journal_mode": {"WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+for _name, _allowed in ALLOWED_PRAGMA_VALUES.items():
+    if DB_PRAGMAS[_name] not in _allowed:
+        raise ValueError(f"Valor inválido para {_name}: {DB_PRAGMAS[_name]}")
+
 # Shares (sempre Rafa 60 / Lucas 40)
 LUCAS_SHARE = 0.40
 RAFA_SHARE = 0.60
@@ -42,6 +110,17 @@ ALLOWED_CATEGORIAS = {
 
 TEMPLATE_REQUIRED_COLUMNS = ["Data", "Pagador", "Categoria", "Descrição", "Valor", "Rateio"]
 
+# A validação do template para depois de tantos erros (0 = valida tudo)
+TEMPLATE_MAX_ERRORS = int(os.environ.get("TEMPLATE_MAX_ERRORS", "50"))
+# Erros mostrados na tela: cabe o orçamento inteiro mais o aviso de validação interrompida
+TEMPLATE_ERRORS_SHOWN = max(50, TEMPLATE_MAX_ERRORS + 1)
+
+# Resumos (Casa / Individual) guardados por worker (0 = desliga o cache)
+SUMMARY_CACHE_SIZE = int(os.environ.get("SUMMARY_CACHE_SIZE", "256"))
+# Cache compartilhado entre workers, num arquivo SQLite separado ("" = desliga)
+SUMMARY_SHARED_DB = os.environ.get("SUMMARY_SHARED_DB", "summary_cache.db")
+SUMMARY_SHARED_TTL_SECONDS = int(os.environ.get("SUMMARY_SHARED_TTL_SECONDS", "3600"))
+
 # Template download path inside repo
 TEMPLATE_FILE_PATH = os.path.join("static", "templates_download", "Template__Finanças__Casella.xlsx")
 
@@ -249,12 +328,150 @@ def month_ref_from(year_str: str, month_str: str) -> str:
     return f"{year_str}{month_str}"
 
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+def _open_db(readonly: bool = False):
+    # check_same_thread=False: a conexão pode voltar ao pool e ser usada por
+    # outra thread do mesmo worker, mas nunca por duas ao mesmo tempo
+    if readonly:
+        # journal_mode=WAL fica gravado no arquivo; leitores não precisam (nem podem) mudar
+        conn = sqlite3.connect(
+            "file:" + urllib.parse.quote(os.path.abspath(DB_PATH)) + "?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            timeout=DB_PRAGMAS["busy_timeout"] / 1000,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {DB_PRAGMAS['busy_timeout']}")
+        conn.execute(f"PRAGMA cache_size = {DB_PRAGMAS['cache_size']}")
+        conn.execute(f"PRAGMA mmap_size = {DB_PRAGMAS['mmap_size']}")
+        conn.execute(f"PRAGMA temp_store = {DB_PRAGMAS['temp_store']}")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        timeout=DB_PRAGMAS["busy_timeout"] / 1000,
+    )
     conn.row_factory = sqlite3.Row
+    apply_pragmas(conn)
     return conn
 
 
+def apply_pragmas(conn):
+    # busy_timeout primeiro, para o journal_mode=WAL também esperar o lock
+    conn.execute(f"PRAGMA busy_timeout = {DB_PRAGMAS['busy_timeout']}")
+    conn.execute(f"PRAGMA journal_mode = {DB_PRAGMAS['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {DB_PRAGMAS['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {DB_PRAGMAS['cache_size']}")
+    conn.execute(f"PRAGMA mmap_size = {DB_PRAGMAS['mmap_size']}")
+    conn.execute(f"PRAGMA temp_store = {DB_PRAGMAS['temp_store']}")
+
+
+def describe_pragmas(conn) -> dict:
+    """Valores efetivos (o SQLite pode recusar, ex: WAL em :memory:)."""
+    out = {}
+    for name in DB_PRAGMAS:
+        row = conn.execute(f"PRAGMA {name}").fetchone()
+        out[name] = row[0] if row else None
+    return out
+
+
+class ConnectionPool:
+    """
+    Pool limitado de conexões ociosas, por processo.
+    Se o pid mudar (fork do gunicorn), as conexões herdadas são descartadas.
+    """
+
+    def __init__(self, size: int, readonly: bool = False):
+        self.size = max(0, size)
+        self.readonly = readonly
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=self.size) if self.size else None
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue(maxsize=self.size) if self.size else None
+
+    def acquire(self):
+        self._check_fork()
+        if self._idle is not None:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+        return _open_db(readonly=self.readonly)
+
+    def release(self, conn):
+        self._check_fork()
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle is not None:
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close()
+
+
+db_pool = ConnectionPool(DB_POOL_SIZE)
+db_ro_pool = ConnectionPool(DB_POOL_SIZE, readonly=True)
+
+
+class ReadOnlyRequestError(RuntimeError):
+    """Um GET tentou gravar pela conexão somente leitura."""
+
+
+def _request_is_readonly() -> bool:
+    # fora de request (boot, CLI, threads de import) sempre leitura/escrita
+    return has_request_context() and request.method in READ_ONLY_METHODS
+
+
+def get_db():
+    """
+    Conexão do contexto atual (uma por request).
+    Em GET/HEAD ela é somente leitura; escritas intencionais usam get_write_db().
+    Não feche: ela volta para o pool (ou é fechada) no teardown.
+    """
+    if "db" not in g:
+        g.db_readonly = _request_is_readonly()
+        g.db = (db_ro_pool if g.db_readonly else db_pool).acquire()
+    return g.db
+
+
+def get_write_db():
+    """
+    Conexão de escrita. Fora de GET é a mesma de get_db(); num GET é uma
+    segunda conexão, usada só para escritas explícitas (ex: semear fixos).
+    """
+    if not _request_is_readonly():
+        return get_db()
+    if "db_rw" not in g:
+        g.db_rw = db_pool.acquire()
+    return g.db_rw
+
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop("db", None)
+    if conn is not None:
+        (db_ro_pool if g.pop("db_readonly", False) else db_pool).release(conn)
+    conn = g.pop("db_rw", None)
+    if conn is not None:
+        db_pool.release(conn)
+
+
+@app.errorhandler(sqlite3.OperationalError)
+def readonly_write_error(e):
+    if g.get("db_readonly") and "readonly" in str(e):
+        raise ReadOnlyRequestError(
+            f"{request.method} {request.path} tentou gravar no banco pela conexão somente leitura; "
+            "use get_write_db() para escritas intencionais ou mova a escrita para um POST"
+        ) from e
+    raise e
+
+
 def _col_exists(conn, table: str, col: str) -> bool:
     cur = conn.cursor()
     cur.execute(f"PRAGMA table_info({table})")
@@ -327,6 +544,7 @@ def topbar_html(profile: str):
           <a class="btn" href="{url_for('casa')}">Casa</a>
           <a class="btn" href="{url_for('individual')}">Individual</a>
           <a class="btn" href="{url_for('renda')}">Renda</a>
+          <a class="btn" href="{url_for('busca')}">Busca</a>
           <a class="btn" href="{url_for('home')}">Trocar perfil</a>
         </div>
         """
@@ -346,6 +564,65 @@ def topbar_html(profile: str):
     """
 
 
+# =========================
+# Versões por mês (invalidação de cache)
+# =========================
+def bump_month_version(conn, *month_refs: str, data: bool = True):
+    """
+    Marca os meses como alterados. Chamar na mesma transação da escrita,
+    antes do commit, para versão e dados ficarem visíveis juntos.
+    data=False para escritas que mudam a página mas não os resultados do mês
+    (fechar/abrir, previews): data_version fica igual e os snapshots continuam valendo.
+    """
+    now = dt.datetime.utcnow().isoformat(timespec="seconds")
+    conn.executemany("""
+      INSERT INTO month_versions (month_ref, version, data_version, updated_at)
+      VALUES (?, 1, ?, ?)
+      ON CONFLICT (month_ref) DO UPDATE SET
+        version = version + 1,
+        data_version = data_version + excluded.data_version,
+        updated_at = excluded.updated_at
+    """, [(m, 1 if data else 0, now) for m in sorted(set(month_refs))])
+
+
+def get_month_version(month_ref: str) -> int:
+    row = get_db().execute("SELECT version FROM month_versions WHERE month_ref = ?", (month_ref,)).fetchone()
+    return int(row["version"]) if row else 0
+
+
+# hash do próprio código: muda a cada deploy e é igual em todos os workers
+with open(__file__, "rb") as _f:
+    APP_BUILD = hashlib.sha1(_f.read()).hexdigest()[:12]
+
+
+def month_page_etag(month_ref: str, profile: str) -> str:
+    # semear fixos muda a versão, então vem antes da leitura
+    ensure_fixed_rows(month_ref)
+    key = f"{APP_BUILD}:{month_ref}:{profile}:{get_month_version(month_ref)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def not_modified(etag):
+    """GET condicional: 304 (sem montar a página) se o navegador já tem essa versão."""
+    if etag is None or request.method not in READ_ONLY_METHODS:
+        return None
+    if not request.if_none_match.contains(etag):
+        return None
+    resp = app.response_class(status=304)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def with_etag(html: str, etag):
+    resp = make_response(html)
+    if etag is not None and request.method in READ_ONLY_METHODS:
+        resp.set_etag(etag)
+        # no-cache = sempre revalida; private = depende do perfil na sessão
+        resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
 # =========================
 # Month lock (por perfil)
 # =========================
@@ -359,7 +636,6 @@ def is_month_locked(month_ref: str, profile: str) -> bool:
       LIMIT 1
     """, (month_ref, profile))
     row = cur.fetchone()
-    conn.close()
     return bool(row["is_locked"]) if row else False
 
 
@@ -380,8 +656,9 @@ def set_month_lock(month_ref: str, profile: str, locked: bool):
           INSERT INTO month_locks (month_ref, profile, is_locked, created_at, updated_at)
           VALUES (?, ?, ?, ?, ?)
         """, (month_ref, profile, 1 if locked else 0, now, now))
+    bump_month_version(conn, month_ref, data=False)
+    refresh_month_snapshots(conn, month_ref)
     conn.commit()
-    conn.close()
 
 
 # =========================
@@ -403,109 +680,179 @@ PENDENTES = [
 ]
 
 
-def ensure_fixed_rows(month_ref: str):
+# meses cujos fixos já estão completos (memo por processo, evita até o SELECT)
+_fixed_seeded = set()
+
+
+def ensure_fixed_rows(month_ref: str, force: bool = False):
     """
     Garante que os fixos existam no mês, mas sem duplicar.
     Eles entram como Casa (rateio 60/40) e com pagador real definido.
+    Idempotente e seguro entre workers: índices únicos (um batch 'fixed' por mês,
+    um fixo por descrição) + INSERT ... ON CONFLICT DO NOTHING. Quando o mês já
+    está completo não grava nada, então GETs não pegam o lock de escrita.
     """
+    if not force and month_ref in _fixed_seeded:
+        return 0
+
     conn = get_db()
     cur = conn.cursor()
-
-    # batch fixo por mês
     cur.execute("""
-      SELECT batch_id FROM imports
-      WHERE month_ref = ? AND source = 'fixed' AND status = 'imported'
-      LIMIT 1
+      SELECT COUNT(*) AS c FROM transactions
+      WHERE month_ref = ? AND uploaded_by = 'system'
     """, (month_ref,))
-    existing_batch = cur.fetchone()
-    batch_id = existing_batch["batch_id"] if existing_batch else None
+    if int(cur.fetchone()["c"]) >= len(FIXOS):
+        _fixed_seeded.add(month_ref)
+        return 0
 
-    if not batch_id:
-        batch_id = uuid.uuid4().hex
-        now = dt.datetime.utcnow().isoformat(timespec="seconds")
+    # mês novo: escrita num GET, por conexão de escrita explícita
+    conn = get_write_db()
+    cur = conn.cursor()
+    now = dt.datetime.utcnow().isoformat(timespec="seconds")
+    try:
+        # batch fixo por mês (id determinístico; meses antigos mantêm o uuid que já tinham)
         cur.execute("""
           INSERT INTO imports (batch_id, month_ref, uploaded_by, filename, row_count, status, created_at, file_hash, source)
-          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (batch_id, month_ref, "system", "fixed", 0, "imported", now, None, "fixed"))
-        conn.commit()
-
-    # para cada fixo, se não existir uma linha igual naquele mês, criar
-    created = 0
-    for desc, valor, pagador_real, rateio in FIXOS:
-        cur.execute("""
-          SELECT 1 FROM transactions t
-          JOIN imports i ON i.batch_id = t.batch_id
-          WHERE t.month_ref = ?
-            AND i.status = 'imported'
-            AND i.source = 'fixed'
-            AND t.descricao = ?
-          LIMIT 1
-        """, (month_ref, desc))
-        if cur.fetchone():
-            continue
+          VALUES (?, ?, 'system', 'fixed', 0, 'imported', ?, NULL, 'fixed')
+          ON CONFLICT DO NOTHING
+        """, (f"fixed-{month_ref}", month_ref, now))
+        cur.execute("SELECT batch_id FROM imports WHERE month_ref = ? AND source = 'fixed'", (month_ref,))
+        batch_id = cur.fetchone()["batch_id"]
 
-        now = dt.datetime.utcnow().isoformat(timespec="seconds")
-        cur.execute("""
+        cur.executemany("""
           INSERT INTO transactions
           (batch_id, month_ref, uploaded_by, dt_text, descricao, categoria, valor, tipo,
            pagador_label, pagador_real, rateio_display, dono, observacao, parcela, created_at)
-          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            batch_id,
-            month_ref,
-            "system",
-            "",  # data opcional
-            desc,
-            "Contas da Casa",
-            float(valor),
-            "Saida",
-            "Casa",          # label para mostrar como "Casa" (casa / casal)
-            pagador_real,    # quem pagou de fato
-            rateio,
-            "Casa",
-            "Fixo",
-            "",
-            now
-        ))
-        created += 1
-
-    # atualiza row_count
-    cur.execute("SELECT COUNT(*) as c FROM transactions WHERE batch_id = ?", (batch_id,))
-    c = int(cur.fetchone()["c"])
-    cur.execute("UPDATE imports SET row_count = ? WHERE batch_id = ?", (c, batch_id))
+          VALUES (?, ?, 'system', '', ?, 'Contas da Casa', ?, 'Saida', 'Casa', ?, ?, 'Casa', 'Fixo', '', ?)
+          ON CONFLICT DO NOTHING
+        """, [
+            # label "Casa" (casa / casal), pagador_real = quem pagou de fato
+            (batch_id, month_ref, desc, float(valor), pagador_real, rateio, now)
+            for desc, valor, pagador_real, rateio in FIXOS
+        ])
+        # rowcount não inclui o que os triggers (FTS, resumos) gravam
+        created = cur.rowcount
 
-    conn.commit()
-    conn.close()
+        cur.execute("""
+          UPDATE imports
+          SET row_count = (SELECT COUNT(*) FROM transactions WHERE batch_id = ?)
+          WHERE batch_id = ?
+        """, (batch_id, batch_id))
+        if created:
+            bump_month_version(conn, month_ref)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    _fixed_seeded.add(month_ref)
     return created
 
 
+def fts_prefix_query(term: str) -> str:
+    """Termo livre -> consulta FTS5 em que cada palavra vale como prefixo ("gas" casa "Gás", "Gasolina")."""
+    words = re.findall(r"\w+", term)
+    return " ".join('"' + w + '"*' for w in words)
+
+
+# Acentos dobrados do mesmo jeito em Python e em SQL (os triggers não chamam funções Python)
+ACCENT_FOLD = {
+    "á": "a", "à": "a", "â": "a", "ã": "a", "ä": "a",
+    "é": "e", "è": "e", "ê": "e", "ë": "e",
+    "í": "i", "ì": "i", "î": "i", "ï": "i",
+    "ó": "o", "ò": "o", "ô": "o", "õ": "o", "ö": "o",
+    "ú": "u", "ù": "u", "û": "u", "ü": "u",
+    "ç": "c", "ñ": "n",
+}
+ACCENT_FOLD.update({k.upper(): v.upper() for k, v in list(ACCENT_FOLD.items())})
+_ACCENT_FOLD_TABLE = str.maketrans(ACCENT_FOLD)
+
+
+def fold_accents(text) -> str:
+    return _normalize_str(text).translate(_ACCENT_FOLD_TABLE)
+
+
+def fold_accents_sql(expr: str, chunk: int = 12) -> str:
+    """
+    Mesma dobra de fold_accents, como expressão SQL. Os REPLACE vão em
+    etapas de subconsulta: aninhados direto (48) estouram a pilha do parser.
+    """
+    pairs = list(ACCENT_FOLD.items())
+    for i in range(0, len(pairs), chunk):
+        inner = "v"
+        for src, dst in pairs[i:i + chunk]:
+            inner = f"REPLACE({inner}, '{src}', '{dst}')"
+        expr = f"(SELECT {inner} FROM (SELECT {expr} AS v))"
+    return expr
+
+
 def pendentes_status(month_ref: str):
     """
     Considera "preenchido" se existe pelo menos uma transação do mês
-    com descricao contendo o termo (case-insensitive) e dono Casa.
+    com descricao contendo o termo (substring, sem diferenciar maiúsculas e acentos)
+    e dono Casa. Uma consulta só, pelo índice trigram da descricao sem acentos;
+    termos com menos de 3 letras (que o trigram não indexa) caem no LIKE.
     """
+    if not PENDENTES:
+        return []
     conn = get_db()
     cur = conn.cursor()
-    result = []
-    for term, cat in PENDENTES:
-        cur.execute("""
+    terms_sql = ", ".join("(?, ?, ?)" for _ in PENDENTES)
+    params = []
+    for i, (term, _cat) in enumerate(PENDENTES):
+        folded = fold_accents(term)
+        like = folded.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.extend([i, '"' + folded.replace('"', '""') + '"', like])
+    cur.execute(f"""
+      WITH terms(idx, q, pat) AS (VALUES {terms_sql})
+      SELECT terms.idx
+      FROM terms
+      WHERE (
+        length(terms.pat) >= 3 AND EXISTS (
+          SELECT 1 FROM transactions_trgm f
+          JOIN transactions t ON t.id = f.rowid
+          WHERE transactions_trgm MATCH terms.q
+            AND t.month_ref = ?
+            AND t.dono = 'Casa'
+        )
+      ) OR (
+        length(terms.pat) < 3 AND EXISTS (
           SELECT 1 FROM transactions t
-          JOIN imports i ON i.batch_id = t.batch_id
           WHERE t.month_ref = ?
-            AND i.status = 'imported'
             AND t.dono = 'Casa'
-            AND LOWER(t.descricao) LIKE ?
-          LIMIT 1
-        """, (month_ref, f"%{term.lower()}%"))
-        filled = cur.fetchone() is not None
-        result.append({"term": term, "categoria": cat, "filled": filled})
-    conn.close()
-    return result
+            AND {fold_accents_sql("t.descricao")} LIKE '%' || terms.pat || '%' ESCAPE '\\'
+        )
+      )
+    """, params + [month_ref, month_ref])
+    filled_idx = {r["idx"] for r in cur.fetchall()}
+    return [
+        {"term": term, "categoria": cat, "filled": i in filled_idx}
+        for i, (term, cat) in enumerate(PENDENTES)
+    ]
+
+
+# (month_ref, profile) -> (versão do mês, html); um item por mês/perfil já visto
+_top_block_cache = {}
 
 
 def month_top_block(month_ref: str, profile: str):
-    # garante fixos sempre existindo
+    """
+    Bloco de topo (fixos, pendentes, fechar mês), cacheado por versão do mês.
+    No cache hit a única consulta é a leitura da versão.
+    """
+    key = (month_ref, profile)
+    cached = _top_block_cache.get(key)
+    if cached and cached[0] == get_month_version(month_ref):
+        return cached[1]
+
+    # garante fixos sempre existindo (semear também incrementa a versão)
     ensure_fixed_rows(month_ref)
+    version = get_month_version(month_ref)
+    html = _render_month_top_block(month_ref, profile)
+    _top_block_cache[key] = (version, html)
+    return html
+
+
+def _render_month_top_block(month_ref: str, profile: str):
     pend = pendentes_status(month_ref)
     pending_count = sum(1 for p in pend if not p["filled"])
     locked = is_month_locked(month_ref, profile)
@@ -573,8 +920,12 @@ def month_top_block(month_ref: str, profile: str):
 # =========================
 # DB init + migrations
 # =========================
-def init_db():
-    conn = get_db()
+# Colunas gravadas em transactions / preview_transactions (id fica de fora)
+TRANSACTION_COLUMNS = """batch_id, month_ref, uploaded_by, dt_text, descricao, categoria, valor, tipo,
+   pagador_label, pagador_real, rateio_display, dono, observacao, parcela, created_at, fingerprint"""
+
+
+def _migration_001_base_schema(conn):
     cur = conn.cursor()
 
     cur.execute("""
@@ -588,6 +939,7 @@ def init_db():
       created_at TEXT NOT NULL
     )
     """)
+    # bancos antigos (antes das migrations numeradas) podem não ter essas colunas
     if not _col_exists(conn, "imports", "file_hash"):
         cur.execute("ALTER TABLE imports ADD COLUMN file_hash TEXT")
     if not _col_exists(conn, "imports", "source"):
@@ -618,13 +970,10 @@ def init_db():
     )
     """)
 
-    # migrate from older schema if needed (columns existence)
-    # If old columns exist but new ones not, add them
     for col in ["descricao", "pagador_label", "pagador_real", "rateio_display", "dono", "observacao", "parcela"]:
         if not _col_exists(conn, "transactions", col):
             cur.execute(f"ALTER TABLE transactions ADD COLUMN {col} TEXT")
 
-    # incomes table (keep)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS incomes (
       id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -639,7 +988,6 @@ def init_db():
     )
     """)
 
-    # investments table (keep)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS investments (
       id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -653,7 +1001,6 @@ def init_db():
     )
     """)
 
-    # month locks (new)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS month_locks (
       id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -666,11 +1013,415 @@ def init_db():
     )
     """)
 
-    conn.commit()
-    conn.close()
+
+def _migration_002_hot_path_indexes(conn):
+    cur = conn.cursor()
+    # leituras por mês (casa / individual / pendentes)
+    cur.execute("""
+      CREATE INDEX IF NOT EXISTS idx_transactions_month_dono_rateio
+      ON transactions (month_ref, dono, rateio_display)
+    """)
+    # join com imports e delete_batch
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_batch ON transactions (batch_id)")
+    # filtros de status/source por mês (fixos, previews, lista de batches)
+    cur.execute("""
+      CREATE INDEX IF NOT EXISTS idx_imports_month_status_source
+      ON imports (month_ref, status, source)
+    """)
+    cur.execute("ANALYZE")
+
+
+def _migration_003_preview_staging(conn):
+    cur = conn.cursor()
+    # previews ficam fora de transactions até o finalize_import
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS preview_transactions (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      batch_id TEXT NOT NULL,
+      month_ref TEXT NOT NULL,
+      uploaded_by TEXT NOT NULL,
+
+      dt_text TEXT,
+      descricao TEXT,
+      categoria TEXT,
+      valor REAL NOT NULL,
+      tipo TEXT NOT NULL,
+
+      pagador_label TEXT,
+      pagador_real TEXT,
+      rateio_display TEXT,
+
+      dono TEXT,
+      observacao TEXT,
+      parcela TEXT,
+
+      created_at TEXT NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_preview_transactions_batch ON preview_transactions (batch_id)")
+
+    # move previews antigos para a staging (colunas do schema desta versão)
+    cols = """batch_id, month_ref, uploaded_by, dt_text, descricao, categoria, valor, tipo,
+      pagador_label, pagador_real, rateio_display, dono, observacao, parcela, created_at"""
+    cur.execute(f"""
+      INSERT INTO preview_transactions ({cols})
+      SELECT {cols}
+      FROM transactions
+      WHERE batch_id IN (SELECT batch_id FROM imports WHERE status = 'preview')
+      ORDER BY id
+    """)
+    cur.execute("""
+      DELETE FROM transactions
+      WHERE batch_id IN (SELECT batch_id FROM imports WHERE status = 'preview')
+    """)
+
+
+def _migration_004_import_jobs(conn):
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS import_jobs (
+      job_id TEXT PRIMARY KEY,
+      month_ref TEXT NOT NULL,
+      uploaded_by TEXT NOT NULL,
+      filename TEXT,
+      file_hash TEXT,
+      status TEXT NOT NULL,
+      parsed INTEGER NOT NULL DEFAULT 0,
+      validated INTEGER NOT NULL DEFAULT 0,
+      inserted INTEGER NOT NULL DEFAULT 0,
+      batch_id TEXT,
+      errors TEXT,
+      created_at TEXT NOT NULL,
+      updated_at TEXT NOT NULL
+    )
+    """)
 
 
-init_db()
+def _migration_005_row_fingerprints(conn):
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE transactions ADD COLUMN fingerprint TEXT")
+    cur.execute("ALTER TABLE preview_transactions ADD COLUMN fingerprint TEXT")
+    # só linhas de planilha têm fingerprint (manuais e fixos ficam NULL)
+    cur.execute("""
+      CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint
+      ON transactions (fingerprint) WHERE fingerprint IS NOT NULL
+    """)
+
+    _backfill_row_fingerprints(cur)
+
+
+def _backfill_row_fingerprints(cur):
+    # duplicatas que já estão no banco ficam sem fingerprint (OR IGNORE)
+    for table, status in (("transactions", "imported"), ("preview_transactions", "preview")):
+        cur.execute(f"""
+          SELECT t.id, t.batch_id, t.month_ref, t.uploaded_by, t.dt_text, t.descricao, t.valor, t.pagador_real
+          FROM {table} t
+          JOIN imports i ON i.batch_id = t.batch_id
+          WHERE i.source = 'template_xlsx' AND i.status = ?
+          ORDER BY t.batch_id, t.id
+        """, (status,))
+        updates = []
+        for batch_id, batch_rows in groupby(cur.fetchall(), key=lambda r: r["batch_id"]):
+            batch_rows = list(batch_rows)
+            rows = [
+                {"Data": r["dt_text"], "Descrição": r["descricao"], "Valor": r["valor"], "PagadorReal": r["pagador_real"]}
+                for r in batch_rows
+            ]
+            add_row_fingerprints(rows, batch_rows[0]["uploaded_by"], batch_rows[0]["month_ref"])
+            updates.extend((row["Fingerprint"], r["id"]) for row, r in zip(rows, batch_rows))
+        cur.executemany(f"UPDATE OR IGNORE {table} SET fingerprint = ? WHERE id = ?", updates)
+
+
+def _migration_006_unique_fixed_rows(conn):
+    cur = conn.cursor()
+    # corridas antigas entre workers podem ter criado fixos em dobro:
+    # fica o fixo mais antigo de cada (mês, descrição), todos no batch fixo mais antigo do mês
+    cur.execute("""
+      DELETE FROM transactions
+      WHERE uploaded_by = 'system'
+        AND id NOT IN (
+          SELECT MIN(id) FROM transactions WHERE uploaded_by = 'system' GROUP BY month_ref, descricao
+        )
+    """)
+    keep_batch = """
+      SELECT i.batch_id FROM imports i
+      WHERE i.month_ref = {table}.month_ref AND i.source = 'fixed'
+      ORDER BY i.created_at, i.batch_id
+      LIMIT 1
+    """
+    cur.execute(f"""
+      UPDATE transactions
+      SET batch_id = ({keep_batch.format(table="transactions")})
+      WHERE uploaded_by = 'system'
+        AND EXISTS ({keep_batch.format(table="transactions")})
+    """)
+    cur.execute(f"""
+      DELETE FROM imports
+      WHERE source = 'fixed'
+        AND batch_id <> ({keep_batch.format(table="imports")})
+    """)
+    cur.execute("""
+      UPDATE imports
+      SET row_count = (SELECT COUNT(*) FROM transactions t WHERE t.batch_id = imports.batch_id)
+      WHERE source = 'fixed'
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_imports_fixed_month ON imports (month_ref) WHERE source = 'fixed'")
+    cur.execute("""
+      CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fixed
+      ON transactions (month_ref, descricao) WHERE uploaded_by = 'system'
+    """)
+
+
+def _migration_007_descricao_fts(conn):
+    cur = conn.cursor()
+    # índice externo (sem cópia do texto); remove_diacritics: "Gás" casa com "Gas"
+    cur.execute("""
+      CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        descricao,
+        content = 'transactions',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+      )
+    """)
+    cur.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+    cur.execute("""
+      CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, descricao) VALUES (new.id, new.descricao);
+      END
+    """)
+    cur.execute("""
+      CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, descricao) VALUES ('delete', old.id, old.descricao);
+      END
+    """)
+    cur.execute("""
+      CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF descricao ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, descricao) VALUES ('delete', old.id, old.descricao);
+        INSERT INTO transactions_fts (rowid, descricao) VALUES (new.id, new.descricao);
+      END
+    """)
+
+
+def _migration_008_search_fts(conn):
+    cur = conn.cursor()
+    # a busca cobre também categoria e observacao: recria o índice com as três colunas
+    for trg in ("transactions_fts_ai", "transactions_fts_ad", "transactions_fts_au"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {trg}")
+    cur.execute("DROP TABLE IF EXISTS transactions_fts")
+    cur.execute("""
+      CREATE VIRTUAL TABLE transactions_fts USING fts5(
+        descricao,
+        categoria,
+        observacao,
+        content = 'transactions',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+      )
+    """)
+    cur.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+    cur.execute("""
+      CREATE TRIGGER transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, descricao, categoria, observacao)
+        VALUES (new.id, new.descricao, new.categoria, new.observacao);
+      END
+    """)
+    cur.execute("""
+      CREATE TRIGGER transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, descricao, categoria, observacao)
+        VALUES ('delete', old.id, old.descricao, old.categoria, old.observacao);
+      END
+    """)
+    cur.execute("""
+      CREATE TRIGGER transactions_fts_au AFTER UPDATE OF descricao, categoria, observacao ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, descricao, categoria, observacao)
+        VALUES ('delete', old.id, old.descricao, old.categoria, old.observacao);
+        INSERT INTO transactions_fts (rowid, descricao, categoria, observacao)
+        VALUES (new.id, new.descricao, new.categoria, new.observacao);
+      END
+    """)
+
+
+def _migration_009_month_versions(conn):
+    # contador por mês, incrementado a cada escrita que muda o que as páginas mostram
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS month_versions (
+        month_ref TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+      )
+    """)
+
+
+def _migration_010_month_summaries(conn):
+    cur = conn.cursor()
+    # somas cruas por (mês, perfil, kind, categoria); as proporções 60/40 entram na leitura
+    cur.execute("""
+      CREATE TABLE IF NOT EXISTS month_category_summary (
+        month_ref TEXT NOT NULL,
+        profile TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        cat TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        first_id INTEGER,
+        last_id INTEGER,
+        total REAL NOT NULL,
+        total_6040 REAL NOT NULL,
+        total_5050 REAL NOT NULL,
+        paid_lucas REAL NOT NULL,
+        paid_rafa REAL NOT NULL,
+        PRIMARY KEY (month_ref, profile, kind, cat)
+      )
+    """)
+    cur.execute("""
+      CREATE VIEW IF NOT EXISTS month_summary AS
+      SELECT month_ref, profile, kind,
+             SUM(n) AS n, SUM(total) AS total, SUM(total_6040) AS total_6040, SUM(total_5050) AS total_5050,
+             SUM(paid_lucas) AS paid_lucas, SUM(paid_rafa) AS paid_rafa
+      FROM month_category_summary
+      GROUP BY month_ref, profile, kind
+    """)
+    for sql in month_summary_trigger_sql():
+        cur.execute(sql)
+    rebuild_month_summaries(conn)
+
+
+def _migration_011_month_snapshots(conn):
+    # resultados congelados ao fechar o mês (um por perfil que fechou)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS month_snapshots (
+        month_ref TEXT NOT NULL,
+        profile TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        build TEXT NOT NULL,
+        casa_json TEXT NOT NULL,
+        individual_json TEXT NOT NULL,
+        casa_rows_html TEXT NOT NULL,
+        house_rows_html TEXT NOT NULL,
+        personal_rows_html TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (month_ref, profile)
+      )
+    """)
+
+
+def _migration_012_month_in_undated_fingerprints(conn):
+    # fingerprints antigos de linhas sem data não tinham o mês: recalcula tudo com a regra nova
+    cur = conn.cursor()
+    cur.execute("UPDATE transactions SET fingerprint = NULL WHERE fingerprint IS NOT NULL")
+    cur.execute("UPDATE preview_transactions SET fingerprint = NULL WHERE fingerprint IS NOT NULL")
+    _backfill_row_fingerprints(cur)
+
+
+def _migration_013_descricao_trigram(conn):
+    cur = conn.cursor()
+    # pendentes procuram substring ("gas" em "COMGAS"): trigram sobre a descricao sem acentos.
+    # contentless: o texto dobrado só existe no índice; o 'delete' recebe o mesmo texto dobrado
+    cur.execute("""
+      CREATE VIRTUAL TABLE IF NOT EXISTS transactions_trgm USING fts5(
+        descricao_fold,
+        content = '',
+        tokenize = 'trigram'
+      )
+    """)
+    cur.execute(f"""
+      INSERT INTO transactions_trgm (rowid, descricao_fold)
+      SELECT id, {fold_accents_sql("descricao")} FROM transactions
+    """)
+    cur.execute(f"""
+      CREATE TRIGGER IF NOT EXISTS transactions_trgm_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_trgm (rowid, descricao_fold) VALUES (new.id, {fold_accents_sql("new.descricao")});
+      END
+    """)
+    cur.execute(f"""
+      CREATE TRIGGER IF NOT EXISTS transactions_trgm_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_trgm (transactions_trgm, rowid, descricao_fold)
+        VALUES ('delete', old.id, {fold_accents_sql("old.descricao")});
+      END
+    """)
+    cur.execute(f"""
+      CREATE TRIGGER IF NOT EXISTS transactions_trgm_au AFTER UPDATE OF descricao ON transactions BEGIN
+        INSERT INTO transactions_trgm (transactions_trgm, rowid, descricao_fold)
+        VALUES ('delete', old.id, {fold_accents_sql("old.descricao")});
+        INSERT INTO transactions_trgm (rowid, descricao_fold) VALUES (new.id, {fold_accents_sql("new.descricao")});
+      END
+    """)
+
+
+def _migration_014_month_data_versions(conn):
+    # versão só das escritas que mudam resultados (transações, renda, investimento);
+    # snapshots passam a valer contra ela e sobrevivem a lock/preview/varredura
+    conn.execute("ALTER TABLE month_versions ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+    # partindo da versão atual, os snapshots que ainda valiam continuam valendo
+    conn.execute("UPDATE month_versions SET data_version = version")
+    conn.execute("ALTER TABLE month_snapshots RENAME COLUMN version TO data_version")
+
+
+def _migration_015_snapshot_format(conn):
+    # validade pelo formato do snapshot, não pelo hash do app.py inteiro;
+    # os antigos somem e são refeitos na primeira leitura
+    conn.execute("DELETE FROM month_snapshots")
+    conn.execute("ALTER TABLE month_snapshots RENAME COLUMN build TO format")
+
+
+def _migration_016_summaries_in_cents(conn):
+    # a view nunca foi lida (_compute_casa / _compute_individual leem a tabela)
+    conn.execute("DROP VIEW IF EXISTS month_summary")
+    # triggers que arredondam para centavos e somas refeitas do zero, sem o resíduo dos deltas
+    for sql in month_summary_trigger_sql():
+        conn.execute(sql)
+    rebuild_month_summaries(conn)
+
+
+# (versão, função) em ordem; a versão aplicada fica em PRAGMA user_version.
+# Nunca altere uma migration já publicada, crie a próxima.
+MIGRATIONS = [
+    (1, _migration_001_base_schema),
+    (2, _migration_002_hot_path_indexes),
+    (3, _migration_003_preview_staging),
+    (4, _migration_004_import_jobs),
+    (5, _migration_005_row_fingerprints),
+    (6, _migration_006_unique_fixed_rows),
+    (7, _migration_007_descricao_fts),
+    (8, _migration_008_search_fts),
+    (9, _migration_009_month_versions),
+    (10, _migration_010_month_summaries),
+    (11, _migration_011_month_snapshots),
+    (12, _migration_012_month_in_undated_fingerprints),
+    (13, _migration_013_descricao_trigram),
+    (14, _migration_014_month_data_versions),
+    (15, _migration_015_snapshot_format),
+    (16, _migration_016_summaries_in_cents),
+]
+
+
+def run_migrations(conn) -> int:
+    """
+    Aplica as migrations pendentes, cada uma na sua transação.
+    BEGIN IMMEDIATE garante que dois workers subindo juntos não apliquem a mesma versão.
+    """
+    applied = 0
+    for version, fn in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current >= version:
+                conn.rollback()
+                continue
+            fn(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            applied += 1
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+
+def init_db():
+    conn = get_db()
+    run_migrations(conn)
+    sweep_stale_previews()
+    app.logger.info("SQLite %s em %s: %s", sqlite3.sqlite_version, DB_PATH, describe_pragmas(conn))
 
 
 # =========================
@@ -685,7 +1436,6 @@ def get_income(month_ref: str, profile: str):
       WHERE month_ref = ? AND profile = ?
     """, (month_ref, profile))
     row = cur.fetchone()
-    conn.close()
     if not row:
         return {"salario_1": 0.0, "salario_2": 0.0, "extras": 0.0, "total": 0.0}
     s1 = float(row["salario_1"] or 0)
@@ -714,23 +1464,8 @@ def upsert_income(month_ref: str, profile: str, salario_1: float, salario_2: flo
           VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (month_ref, profile, salario_1, salario_2, extras, now, now))
 
+    bump_month_version(conn, month_ref)
     conn.commit()
-    conn.close()
-
-
-def get_investment(month_ref: str, profile: str):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-      SELECT amount, note
-      FROM investments
-      WHERE month_ref = ? AND profile = ?
-    """, (month_ref, profile))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return {"amount": 0.0, "note": ""}
-    return {"amount": float(row["amount"] or 0), "note": row["note"] or ""}
 
 
 def upsert_investment(month_ref: str, profile: str, amount: float, note: str):
@@ -753,8 +1488,8 @@ def upsert_investment(month_ref: str, profile: str, amount: float, note: str):
           VALUES (?, ?, ?, ?, ?, ?)
         """, (month_ref, profile, amount, note, now, now))
 
+    bump_month_version(conn, month_ref)
     conn.commit()
-    conn.close()
 
 
 # =========================
@@ -768,14 +1503,8 @@ def _insert_import(conn, batch_id, month_ref, uploaded_by, filename, row_count,
     """, (batch_id, month_ref, uploaded_by, filename, row_count, status, created_at, file_hash, source))
 
 
-def _insert_transaction(conn, batch_id, month_ref, uploaded_by, row, created_at):
-    cur = conn.cursor()
-    cur.execute("""
-      INSERT INTO transactions
-      (batch_id, month_ref, uploaded_by, dt_text, descricao, categoria, valor, tipo,
-       pagador_label, pagador_real, rateio_display, dono, observacao, parcela, created_at)
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+def _transaction_params(batch_id, month_ref, uploaded_by, row, created_at) -> tuple:
+    return (
         batch_id,
         month_ref,
         uploaded_by,
@@ -790,8 +1519,42 @@ def _insert_transaction(conn, batch_id, month_ref, uploaded_by, row, created_at)
         row.get("Dono", ""),
         row.get("Observacao", ""),
         row.get("Parcela", ""),
-        created_at
-    ))
+        created_at,
+        row.get("Fingerprint"),
+    )
+
+
+def _insert_transactions(conn, params: list[tuple], chunk_size: int = None, table: str = "transactions",
+                         progress=None, or_ignore: bool = False) -> int:
+    """
+    Grava as linhas com executemany, em blocos de chunk_size.
+    table: "transactions" ou "preview_transactions".
+    progress(n) é chamado com o total gravado após cada bloco.
+    or_ignore: pula linhas cujo fingerprint já existe (retorno conta só as gravadas).
+    Não faz commit: quem chama fecha a transação (tudo ou nada).
+    """
+    if table not in {"transactions", "preview_transactions"}:
+        raise ValueError(f"Tabela inválida: {table}")
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    placeholders = ", ".join(["?"] * len(TRANSACTION_COLUMNS.split(",")))
+    verb = "INSERT OR IGNORE" if or_ignore else "INSERT"
+    sql = f"{verb} INTO {table} ({TRANSACTION_COLUMNS}) VALUES ({placeholders})"
+    # rowcount (e não total_changes): linhas gravadas por triggers (FTS, resumos) não contam
+    inserted = 0
+    started = time.perf_counter()
+    cur = conn.cursor()
+    for i in range(0, len(params), chunk_size):
+        cur.executemany(sql, params[i:i + chunk_size])
+        inserted += cur.rowcount
+        if progress:
+            progress(min(i + chunk_size, len(params)))
+    elapsed = time.perf_counter() - started
+    if params:
+        app.logger.info(
+            "%d linhas gravadas em %.3fs (%.0f linhas/s)",
+            len(params), elapsed, len(params) / elapsed if elapsed > 0 else float("inf"),
+        )
+    return inserted
 
 
 def is_duplicate_import(month_ref: str, uploaded_by: str, file_hash: str) -> bool:
@@ -807,29 +1570,105 @@ def is_duplicate_import(month_ref: str, uploaded_by: str, file_hash: str) -> boo
       LIMIT 1
     """, (month_ref, uploaded_by, file_hash))
     hit = cur.fetchone() is not None
-    conn.close()
     return hit
 
 
-def read_template_xlsx_from_bytes(raw: bytes) -> pd.DataFrame:
-    buf = io.BytesIO(raw)
-    df = pd.read_excel(buf, engine="openpyxl", sheet_name="Template")
+TEMPLATE_TEXT_COLUMNS = ["Data", "Pagador", "Categoria", "Descrição", "Rateio"]
 
-    missing = [c for c in TEMPLATE_REQUIRED_COLUMNS if c not in df.columns]
-    if missing:
-        raise ValueError("Colunas faltando na aba Template: " + ", ".join(missing))
 
-    df = df.copy()
+def _to_float_or_none(x):
+    # equivalente ao pd.to_numeric(errors="coerce"): o que não for número vira None
+    if x is None or isinstance(x, bool):
+        return None
+    try:
+        v = float(str(x).strip()) if isinstance(x, str) else float(x)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(v) else v
+
+
+def read_template_xlsx_from_bytes(raw: bytes):
+    """
+    Lê a aba Template em modo streaming (openpyxl read_only), linha a linha.
+    Gera (linha_excel, registro) com as colunas já normalizadas.
+    Linhas vazias no fim da planilha são ignoradas; no meio, seguem para a validação.
+    """
+    # import tardio: só o upload de planilha precisa do openpyxl
+    import openpyxl
 
-    for col in ["Data", "Pagador", "Categoria", "Descrição", "Rateio"]:
-        df[col] = df[col].apply(_normalize_str)
+    wb = openpyxl.load_workbook(io.BytesIO(raw), read_only=True, data_only=True)
+    try:
+        if "Template" not in wb.sheetnames:
+            raise ValueError("Aba Template não encontrada no arquivo")
+        rows = wb["Template"].iter_rows(values_only=True)
+
+        header = next(rows, None) or ()
+        header = [None if h is None else str(h) for h in header]
+        missing = [c for c in TEMPLATE_REQUIRED_COLUMNS if c not in header]
+        if missing:
+            raise ValueError("Colunas faltando na aba Template: " + ", ".join(missing))
+        positions = {c: header.index(c) for c in TEMPLATE_REQUIRED_COLUMNS}
+
+        blank_run = []
+        for line, values in enumerate(rows, start=2):
+            values = tuple(values) + (None,) * (len(header) - len(values))
+            record = {c: _normalize_str(values[positions[c]]) for c in TEMPLATE_TEXT_COLUMNS}
+            record["Valor"] = _to_float_or_none(values[positions["Valor"]])
+
+            if all(v is None or v == "" for v in values):
+                blank_run.append((line, record))
+                continue
+            yield from blank_run
+            blank_run = []
+            yield line, record
+    finally:
+        wb.close()
+
+
+@lru_cache(maxsize=512)
+def _pagador_rateio_rules(pagador: str, rateio: str, uploaded_by_profile: str):
+    """
+    Tudo que depende só de (Pagador, Rateio, perfil): erros e derivação de
+    PagadorReal/Dono. Uma planilha tem poucas combinações distintas, então
+    cada uma é calculada uma vez e reaproveitada em todas as linhas.
+    Retorna (erros_pagador_rateio, erros_regras, pagador_real, dono);
+    os dois grupos de erro ficam separados para manter a ordem das mensagens
+    (o erro de Valor fica entre eles).
+    """
+    field_errors = []
+    if pagador not in ALLOWED_PAGADOR:
+        field_errors.append("Pagador inválido")
+    if rateio not in ALLOWED_RATEIO_DISPLAY:
+        field_errors.append("Rateio inválido")
+
+    rule_errors = []
+    # rule Casa
+    if pagador == "Casa" and rateio not in {"60/40", "50/50"}:
+        rule_errors.append("Pagador Casa só pode usar rateio 60/40 ou 50/50")
+
+    # Pagador real
+    pagador_real = pagador
+    if pagador == "Casa":
+        pagador_real = uploaded_by_profile
+
+    # dono derivado do rateio
+    dono = ""
+    if rateio in {"60/40", "50/50"}:
+        dono = "Casa"
+    elif rateio == "100%_Meu":
+        dono = pagador_real
+    elif rateio == "100%_Outro":
+        if pagador_real not in {"Lucas", "Rafa"}:
+            rule_errors.append("Rateio 100%_Outro exige pagador Lucas ou Rafa")
+        else:
+            dono = "Rafa" if pagador_real == "Lucas" else "Lucas"
 
-    df["Valor"] = pd.to_numeric(df["Valor"], errors="coerce")
-    return df
+    return tuple(field_errors), tuple(rule_errors), pagador_real, dono
 
 
-def normalize_and_validate_template(df: pd.DataFrame, uploaded_by_profile: str):
+def normalize_and_validate_template(records, uploaded_by_profile: str, max_errors: int = None):
     """
+    Recebe os (linha, registro) de read_template_xlsx_from_bytes.
     Aplica regras:
     - Pagador ∈ {Lucas, Rafa, Casa}
     - Categoria ∈ lista
@@ -839,13 +1678,14 @@ def normalize_and_validate_template(df: pd.DataFrame, uploaded_by_profile: str):
     - Rateio 60/40 ou 50/50 => Dono Casa
     - Rateio 100%_Meu => Dono = pagador_real
     - Rateio 100%_Outro => Dono = outro (se pagador_real Lucas -> Rafa, vice-versa)
+    Ao atingir max_errors para de ler a planilha e avisa no fim da lista de erros.
     """
+    if max_errors is None:
+        max_errors = TEMPLATE_MAX_ERRORS
     errors = []
     rows = []
 
-    for idx, r in df.iterrows():
-        line = idx + 2
-
+    for line, r in records:
         data = r.get("Data", "")
         pagador = r.get("Pagador", "")
         cat = r.get("Categoria", "")
@@ -853,37 +1693,18 @@ def normalize_and_validate_template(df: pd.DataFrame, uploaded_by_profile: str):
         rateio = r.get("Rateio", "")
         valor = r.get("Valor", None)
 
+        field_errors, rule_errors, pagador_real, dono = _pagador_rateio_rules(pagador, rateio, uploaded_by_profile)
+
         if not desc:
             errors.append(f"Linha {line}: Descrição vazia")
-        if not cat or cat not in ALLOWED_CATEGORIAS:
+        if cat not in ALLOWED_CATEGORIAS:
             errors.append(f"Linha {line}: Categoria inválida")
-        if pagador not in ALLOWED_PAGADOR:
-            errors.append(f"Linha {line}: Pagador inválido")
-        if rateio not in ALLOWED_RATEIO_DISPLAY:
-            errors.append(f"Linha {line}: Rateio inválido")
-        if pd.isna(valor) or float(valor) <= 0:
+        for e in field_errors:
+            errors.append(f"Linha {line}: {e}")
+        if valor is None or valor <= 0:
             errors.append(f"Linha {line}: Valor inválido, precisa ser maior que 0")
-
-        # rule Casa
-        if pagador == "Casa" and rateio not in {"60/40", "50/50"}:
-            errors.append(f"Linha {line}: Pagador Casa só pode usar rateio 60/40 ou 50/50")
-
-        # Pagador real
-        pagador_real = pagador
-        if pagador == "Casa":
-            pagador_real = uploaded_by_profile
-
-        # dono derivado do rateio
-        dono = ""
-        if rateio in {"60/40", "50/50"}:
-            dono = "Casa"
-        elif rateio == "100%_Meu":
-            dono = pagador_real
-        elif rateio == "100%_Outro":
-            if pagador_real not in {"Lucas", "Rafa"}:
-                errors.append(f"Linha {line}: Rateio 100%_Outro exige pagador Lucas ou Rafa")
-            else:
-                dono = "Rafa" if pagador_real == "Lucas" else "Lucas"
+        for e in rule_errors:
+            errors.append(f"Linha {line}: {e}")
 
         rows.append({
             "Data": data,
@@ -891,7 +1712,7 @@ def normalize_and_validate_template(df: pd.DataFrame, uploaded_by_profile: str):
             "PagadorReal": pagador_real,
             "Categoria": cat,
             "Descrição": desc,
-            "Valor": None if pd.isna(valor) else float(valor),
+            "Valor": valor,
             "Rateio": rateio,
             "Tipo": "Saida",
             "Dono": dono,
@@ -899,45 +1720,259 @@ def normalize_and_validate_template(df: pd.DataFrame, uploaded_by_profile: str):
             "Parcela": "",
         })
 
+        if max_errors and len(errors) >= max_errors:
+            errors = errors[:max_errors]
+            errors.append(f"Validação interrompida na linha {line} após {max_errors} erros, corrija e envie de novo")
+            break
+
     return errors, rows
 
 
-def create_preview_batch(month_ref: str, uploaded_by: str, filename: str, rows: list[dict], file_hash: str) -> str:
-    batch_id = uuid.uuid4().hex
+def create_preview_batches(rows_by_month: dict, uploaded_by: str, filename: str, file_hash: str,
+                           progress=None) -> list[str]:
+    """
+    Um batch de preview por mês ({month_ref: rows}), todos na mesma transação.
+    Retorna os batch_ids na ordem dos meses.
+    """
     now = dt.datetime.utcnow().isoformat(timespec="seconds")
+    batch_ids = []
+    written = 0
     conn = get_db()
-    _insert_import(conn, batch_id, month_ref, uploaded_by, filename, len(rows), "preview", now, file_hash, "template_xlsx")
+    try:
+        for month_ref, rows in rows_by_month.items():
+            batch_id = uuid.uuid4().hex
+            params = [_transaction_params(batch_id, month_ref, uploaded_by, r, now) for r in rows]
+            _insert_import(conn, batch_id, month_ref, uploaded_by, filename, len(rows), "preview", now, file_hash, "template_xlsx")
+            _insert_transactions(
+                conn, params, table="preview_transactions",
+                progress=(lambda n, base=written: progress(base + n)) if progress else None,
+            )
+            written += len(rows)
+            batch_ids.append(batch_id)
+        bump_month_version(conn, *rows_by_month.keys(), data=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return batch_ids
+
+
+TEMPLATE_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%Y/%m/%d", "%d-%m-%Y")
+
+
+def parse_template_date(text):
+    """Data da coluna Data (ISO, datetime do Excel ou dd/mm/aaaa); None se não der para ler."""
+    text = _normalize_str(text)
+    if not text:
+        return None
+    head = text.split(" ")[0].split("T")[0]
+    for fmt in TEMPLATE_DATE_FORMATS:
+        try:
+            return dt.datetime.strptime(head, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def month_ref_from_date_text(text) -> str:
+    d = parse_template_date(text)
+    return f"{d.year}{d.month:02d}" if d else None
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _normalize_desc(text) -> str:
+    return " ".join(_strip_accents(_normalize_str(text)).lower().split())
+
+
+def add_row_fingerprints(rows: list[dict], uploaded_by: str, month_ref: str):
+    """
+    Preenche row["Fingerprint"]: hash de (perfil, data, descrição, valor em centavos,
+    pagador real) normalizados + a ocorrência dentro do arquivo, para que duas linhas
+    iguais no mesmo extrato continuem distintas, mas a mesma linha reexportada
+    em outro arquivo colida.
+    Sem data legível, o mês de destino entra no lugar da data: a conta sem data
+    de abril não é a mesma de março.
+    """
+    seen = {}
     for r in rows:
-        _insert_transaction(conn, batch_id, month_ref, uploaded_by, r, now)
-    conn.commit()
-    conn.close()
-    return batch_id
+        d = parse_template_date(r.get("Data"))
+        date_key = d.isoformat() if d else f"{month_ref}|{_normalize_str(r.get('Data')).lower()}"
+        desc_key = _normalize_desc(r.get("Descrição"))
+        cents = int(round(float(r.get("Valor") or 0) * 100))
+        base = "|".join([uploaded_by, date_key, desc_key, str(cents), _normalize_str(r.get("PagadorReal"))])
+        seen[base] = seen.get(base, 0) + 1
+        r["Fingerprint"] = hashlib.sha256(f"{base}|{seen[base]}".encode("utf-8")).hexdigest()
 
 
-def finalize_import(batch_id: str, profile: str) -> tuple[bool, str]:
+def find_cross_profile_matches(batch_ids: list[str], uploaded_by: str, limit: int = 50) -> list[dict]:
+    """
+    Linhas do preview que parecem o mesmo gasto já lançado pelo outro perfil.
+    Blocking: os lançamentos do outro perfil nos mesmos meses vão para buckets
+    (month_ref, valor em centavos); cada linha do preview só é comparada com o
+    próprio bucket (janela de datas + similaridade da descrição), então o custo
+    fica perto de linear em vez de n x m.
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    placeholders = ", ".join("?" * len(batch_ids))
+    cur.execute(f"""
+      SELECT month_ref, dt_text, descricao, valor
+      FROM preview_transactions
+      WHERE batch_id IN ({placeholders})
+      ORDER BY id
+    """, tuple(batch_ids))
+    preview = cur.fetchall()
+    if not preview:
+        return []
+
+    months = sorted({p["month_ref"] for p in preview})
+    cur.execute(f"""
+      SELECT month_ref, dt_text, descricao, valor, uploaded_by
+      FROM transactions
+      WHERE month_ref IN ({", ".join("?" * len(months))})
+        AND uploaded_by NOT IN (?, 'system')
+    """, (*months, uploaded_by))
+
+    buckets = {}
+    for c in cur.fetchall():
+        key = (c["month_ref"], int(round(abs(c["valor"]) * 100)))
+        buckets.setdefault(key, []).append((c, parse_template_date(c["dt_text"]), _normalize_desc(c["descricao"])))
+
+    matches = []
+    for p in preview:
+        bucket = buckets.get((p["month_ref"], int(round(abs(p["valor"]) * 100))))
+        if not bucket:
+            continue
+        p_date = parse_template_date(p["dt_text"])
+        p_desc = _normalize_desc(p["descricao"])
+        best = None
+        for c, c_date, c_desc in bucket:
+            # sem data de um dos lados, o bucket (mês + valor) basta como janela
+            if p_date and c_date and abs((p_date - c_date).days) > MATCH_DATE_WINDOW_DAYS:
+                continue
+            score = SequenceMatcher(None, p_desc, c_desc).ratio()
+            if score >= MATCH_MIN_SIMILARITY and (best is None or score > best[1]):
+                best = (c, score)
+        if best:
+            c, score = best
+            matches.append({
+                "data": p["dt_text"],
+                "descricao": p["descricao"],
+                "valor": p["valor"],
+                "other_profile": c["uploaded_by"],
+                "other_data": c["dt_text"],
+                "other_descricao": c["descricao"],
+                "score": score,
+            })
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+def count_known_fingerprints(batch_ids: list[str]) -> int:
+    """Quantas linhas dos previews já existem em transactions (busca pelo índice único)."""
     conn = get_db()
     cur = conn.cursor()
+    cur.execute(f"""
+      SELECT COUNT(*) AS c
+      FROM preview_transactions p
+      WHERE p.batch_id IN ({", ".join("?" * len(batch_ids))})
+        AND p.fingerprint IS NOT NULL
+        AND EXISTS (SELECT 1 FROM transactions t WHERE t.fingerprint = p.fingerprint)
+    """, tuple(batch_ids))
+    return int(cur.fetchone()["c"])
 
-    cur.execute("SELECT * FROM imports WHERE batch_id = ?", (batch_id,))
-    imp = cur.fetchone()
-    if not imp:
-        conn.close()
+
+def group_rows_by_month(rows: list[dict], default_month_ref: str) -> dict:
+    """
+    Separa as linhas pelo mês da coluna Data, numa passada.
+    Linhas sem data legível ficam no mês selecionado. Meses saem em ordem crescente.
+    """
+    groups = {}
+    for r in rows:
+        groups.setdefault(month_ref_from_date_text(r.get("Data")) or default_month_ref, []).append(r)
+    return dict(sorted(groups.items()))
+
+
+def finalize_import(batch_ids: list[str], profile: str) -> tuple[bool, str]:
+    """
+    Promove da staging para transactions os batches de preview de um upload
+    (vários quando o arquivo foi dividido por mês), numa transação só:
+    ou entram todos, ou nenhum.
+    """
+    batch_ids = list(dict.fromkeys(batch_ids))
+    if not batch_ids:
         return False, "Importação não encontrada"
+    conn = get_db()
+    cur = conn.cursor()
 
-    if imp["uploaded_by"] != profile:
-        conn.close()
-        return False, "Você só pode importar batches criados no seu perfil"
+    cur.execute(f"""
+      SELECT *
+      FROM imports
+      WHERE batch_id IN ({", ".join("?" * len(batch_ids))})
+    """, tuple(batch_ids))
+    imports = {r["batch_id"]: r for r in cur.fetchall()}
+    for batch_id in batch_ids:
+        imp = imports.get(batch_id)
+        if not imp:
+            return False, "Importação não encontrada"
 
-    if imp["status"] == "imported":
-        conn.close()
-        return False, "Esse batch já foi importado"
+        if imp["uploaded_by"] != profile:
+            return False, "Você só pode importar batches criados no seu perfil"
 
-    cur.execute("UPDATE imports SET status = 'imported' WHERE batch_id = ?", (batch_id,))
-    conn.commit()
-    conn.close()
+        if imp["status"] == "imported":
+            return False, "Esse batch já foi importado"
+
+        if is_month_locked(imp["month_ref"], profile):
+            return False, f"Mês {imp['month_ref']} fechado para você. Clique em Editar mês no topo para liberar edições."
+
+    skipped = 0
+    try:
+        for batch_id in batch_ids:
+            cur.execute("UPDATE imports SET status = 'imported' WHERE batch_id = ? AND status = 'preview'", (batch_id,))
+            if cur.rowcount != 1:
+                conn.rollback()
+                return False, "Esse batch já foi importado"
+            # linhas com fingerprint já importado são puladas pelo índice único
+            cur.execute(f"""
+              INSERT OR IGNORE INTO transactions ({TRANSACTION_COLUMNS})
+              SELECT {TRANSACTION_COLUMNS}
+              FROM preview_transactions
+              WHERE batch_id = ?
+              ORDER BY id
+            """, (batch_id,))
+            inserted = cur.rowcount
+            cur.execute("DELETE FROM preview_transactions WHERE batch_id = ?", (batch_id,))
+            if cur.rowcount != inserted:
+                skipped += cur.rowcount - inserted
+                cur.execute("UPDATE imports SET row_count = ? WHERE batch_id = ?", (inserted, batch_id))
+        bump_month_version(conn, *[imports[b]["month_ref"] for b in batch_ids])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if skipped:
+        return True, f"Importação concluída, {skipped} linhas já importadas foram ignoradas"
     return True, "Importação concluída"
 
 
+def fetch_preview_months(batch_ids: list[str]) -> list:
+    """(month_ref, row_count) de cada batch de preview."""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(f"""
+      SELECT month_ref, row_count
+      FROM imports
+      WHERE batch_id IN ({", ".join("?" * len(batch_ids))})
+        AND status = 'preview'
+      ORDER BY month_ref
+    """, tuple(batch_ids))
+    return cur.fetchall()
+
+
 def delete_batch(batch_id: str, profile: str) -> tuple[bool, str]:
     conn = get_db()
     cur = conn.cursor()
@@ -945,59 +1980,633 @@ def delete_batch(batch_id: str, profile: str) -> tuple[bool, str]:
     cur.execute("SELECT * FROM imports WHERE batch_id = ?", (batch_id,))
     imp = cur.fetchone()
     if not imp:
-        conn.close()
         return False, "Importação não encontrada"
 
     if imp["uploaded_by"] != profile and imp["uploaded_by"] != "system":
-        conn.close()
         return False, "Você só pode excluir imports feitos no seu perfil"
 
+    # batch manual repetido grava em vários meses
+    cur.execute("SELECT DISTINCT month_ref FROM transactions WHERE batch_id = ?", (batch_id,))
+    touched_months = [r["month_ref"] for r in cur.fetchall()]
+
     cur.execute("DELETE FROM transactions WHERE batch_id = ?", (batch_id,))
+    cur.execute("DELETE FROM preview_transactions WHERE batch_id = ?", (batch_id,))
     cur.execute("DELETE FROM imports WHERE batch_id = ?", (batch_id,))
+    refresh_summary_bounds(conn, touched_months)
+    bump_month_version(conn, imp["month_ref"], *touched_months, data=imp["status"] != "preview")
     conn.commit()
-    conn.close()
+
+    if imp["source"] == "fixed":
+        # fixos sempre existem: excluir o batch volta para os valores padrão
+        ensure_fixed_rows(imp["month_ref"], force=True)
+        return True, "Fixos do mês recriados com os valores padrão"
     return True, "Importação excluída"
 
 
+_last_preview_sweep = 0.0
+
+
+def sweep_stale_previews(ttl_hours: float = None) -> int:
+    """
+    Apaga previews não confirmados mais velhos que ttl_hours (staging + imports).
+    Retorna quantos batches foram removidos.
+    """
+    global _last_preview_sweep
+    _last_preview_sweep = time.monotonic()
+    if ttl_hours is None:
+        ttl_hours = PREVIEW_TTL_HOURS
+    if ttl_hours <= 0:
+        return 0
+    cutoff = (dt.datetime.utcnow() - dt.timedelta(hours=ttl_hours)).isoformat(timespec="seconds")
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT DISTINCT month_ref FROM imports WHERE status = 'preview' AND created_at < ?", (cutoff,))
+        swept_months = [r["month_ref"] for r in cur.fetchall()]
+        cur.execute("""
+          DELETE FROM preview_transactions
+          WHERE batch_id IN (
+            SELECT batch_id FROM imports WHERE status = 'preview' AND created_at < ?
+          )
+        """, (cutoff,))
+        cur.execute("DELETE FROM imports WHERE status = 'preview' AND created_at < ?", (cutoff,))
+        removed = cur.rowcount
+        cur.execute("DELETE FROM import_jobs WHERE updated_at < ?", (cutoff,))
+        bump_month_version(conn, *swept_months, data=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if removed:
+        app.logger.info("%d previews expirados removidos", removed)
+    return removed
+
+
+@app.before_request
+def sweep_previews_periodically():
+    # só em requests de escrita, no máximo uma vez por intervalo em cada worker
+    if request.method != "POST":
+        return
+    if time.monotonic() - _last_preview_sweep < PREVIEW_SWEEP_INTERVAL_SECONDS:
+        return
+    sweep_stale_previews()
+
+
 def fetch_imported_transactions(month_ref: str):
     conn = get_db()
     cur = conn.cursor()
     cur.execute("""
       SELECT t.*, i.source, i.filename, i.status
       FROM transactions t
-      JOIN imports i ON i.batch_id = t.batch_id
+      LEFT JOIN imports i ON i.batch_id = t.batch_id
       WHERE t.month_ref = ?
-        AND i.status = 'imported'
       ORDER BY t.id DESC
     """, (month_ref,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 
-def fetch_house_transactions(month_ref: str):
+def fetch_preview_rows(batch_ids: list[str], limit: int = 25) -> list[dict]:
+    """Primeiras linhas dos previews, no mesmo formato do template."""
     conn = get_db()
     cur = conn.cursor()
-    cur.execute("""
-      SELECT t.*
-      FROM transactions t
-      JOIN imports i ON i.batch_id = t.batch_id
-      WHERE t.month_ref = ?
-        AND i.status = 'imported'
-        AND t.dono = 'Casa'
-        AND t.rateio_display IN ('60/40','50/50')
-      ORDER BY t.id ASC
-    """, (month_ref,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    cur.execute(f"""
+      SELECT dt_text, pagador_label, categoria, descricao, valor, rateio_display
+      FROM preview_transactions
+      WHERE batch_id IN ({", ".join("?" * len(batch_ids))})
+      ORDER BY id ASC
+      LIMIT ?
+    """, (*batch_ids, limit))
+    return [
+        {
+            "Data": r["dt_text"],
+            "Pagador": r["pagador_label"],
+            "Categoria": r["categoria"],
+            "Descrição": r["descricao"],
+            "Valor": r["valor"],
+            "Rateio": r["rateio_display"],
+        }
+        for r in cur.fetchall()
+    ]
+
+
+# =========================
+# Import jobs (background)
+# =========================
+# Estado fica em import_jobs (visível para qualquer worker). O worker que roda o
+# job também guarda os contadores ao vivo em memória, porque durante a gravação
+# o lock de escrita do SQLite é do próprio job.
+IMPORT_JOB_STATUS_LABELS = {
+    "queued": "Na fila",
+    "parsing": "Lendo planilha",
+    "validating": "Validando",
+    "inserting": "Gravando preview",
+    "done": "Concluído",
+    "failed": "Falhou",
+}
+IMPORT_JOB_FLUSH_EVERY = 1000
+
+_import_jobs_local = {}
+_import_jobs_lock = threading.Lock()
+_import_executor = None
+_import_executor_pid = None
+_import_slots = None
+
+
+def _get_import_executor():
+    # um executor por processo (criado depois do fork do gunicorn)
+    global _import_executor, _import_executor_pid, _import_slots
+    if _import_executor is None or _import_executor_pid != os.getpid():
+        _import_executor = ThreadPoolExecutor(max_workers=max(1, IMPORT_MAX_WORKERS), thread_name_prefix="import")
+        _import_executor_pid = os.getpid()
+        _import_slots = threading.BoundedSemaphore(max(1, IMPORT_MAX_PENDING))
+    return _import_executor
+
+
+def _update_import_job(job_id: str, persist: bool = True, **fields):
+    now = dt.datetime.utcnow().isoformat(timespec="seconds")
+    with _import_jobs_lock:
+        job = _import_jobs_local.setdefault(job_id, {})
+        job.update(fields)
+        job["updated_at"] = now
+    if not persist:
+        return
+    if "errors" in fields:
+        fields["errors"] = json.dumps(fields["errors"], ensure_ascii=False)
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    conn = get_db()
+    conn.execute(f"UPDATE import_jobs SET {cols}, updated_at = ? WHERE job_id = ?", (*fields.values(), now, job_id))
+    conn.commit()
+
+
+def _count_parsed(records, job_id: str):
+    n = 0
+    for item in records:
+        n += 1
+        _update_import_job(job_id, persist=n % IMPORT_JOB_FLUSH_EVERY == 0, parsed=n)
+        yield item
+    _update_import_job(job_id, parsed=n, status="validating")
+
+
+def run_import_job(job_id: str, month_ref: str, uploaded_by: str, filename: str, raw: bytes, file_hash: str,
+                   split_by_date: bool = False):
+    with app.app_context():
+        try:
+            _update_import_job(job_id, status="parsing")
+            records = _count_parsed(read_template_xlsx_from_bytes(raw), job_id)
+            errors, rows = normalize_and_validate_template(records, uploaded_by)
+            _update_import_job(job_id, validated=len(rows))
+            if errors:
+                _update_import_job(job_id, status="failed", errors=errors)
+                return
+
+            rows_by_month = group_rows_by_month(rows, month_ref) if split_by_date else {month_ref: rows}
+            for mr, month_rows in rows_by_month.items():
+                add_row_fingerprints(month_rows, uploaded_by, mr)
+            if split_by_date:
+                for mr in rows_by_month:
+                    if is_month_locked(mr, uploaded_by):
+                        errors.append(f"Mês {mr} fechado para você ({len(rows_by_month[mr])} linhas)")
+                for mr, _ in sorted(find_imported_hashes(uploaded_by, [(mr, file_hash) for mr in rows_by_month])):
+                    errors.append(f"Esse mesmo arquivo já foi importado em {mr} para este perfil")
+                if errors:
+                    _update_import_job(job_id, status="failed", errors=errors)
+                    return
+
+            _update_import_job(job_id, status="inserting")
+            batch_ids = create_preview_batches(
+                rows_by_month, uploaded_by, filename, file_hash,
+                progress=lambda n: _update_import_job(job_id, persist=False, inserted=n),
+            )
+            _update_import_job(job_id, status="done", inserted=len(rows), batch_id=",".join(batch_ids))
+        except ValueError as e:
+            # planilha fora do formato (aba/colunas): erro do usuário, sem traceback
+            _update_import_job(job_id, status="failed", errors=[str(e)])
+        except Exception as e:
+            app.logger.exception("Import job %s falhou", job_id)
+            _update_import_job(job_id, status="failed", errors=[str(e)])
+        finally:
+            _import_slots.release()
+            with _import_jobs_lock:
+                _import_jobs_local.pop(job_id, None)
+
+
+def submit_import_job(month_ref: str, uploaded_by: str, filename: str, raw: bytes, file_hash: str,
+                      split_by_date: bool = False):
+    """
+    Enfileira o parse/validação/gravação do arquivo.
+    split_by_date: um batch por mês da coluna Data (month_ref vira o mês padrão).
+    Retorna (job_id, future) ou (None, None) se a fila do worker estiver cheia.
+    batch_id do job pode ter vários ids separados por vírgula.
+    """
+    executor = _get_import_executor()
+    if not _import_slots.acquire(blocking=False):
+        return None, None
+
+    job_id = uuid.uuid4().hex
+    now = dt.datetime.utcnow().isoformat(timespec="seconds")
+    conn = get_db()
+    try:
+        conn.execute("""
+          INSERT INTO import_jobs (job_id, month_ref, uploaded_by, filename, file_hash, status, created_at, updated_at)
+          VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)
+        """, (job_id, month_ref, uploaded_by, filename, file_hash, now, now))
+        conn.commit()
+        with _import_jobs_lock:
+            _import_jobs_local[job_id] = {"status": "queued", "parsed": 0, "validated": 0, "inserted": 0}
+
+        future = executor.submit(run_import_job, job_id, month_ref, uploaded_by, filename, raw, file_hash, split_by_date)
+    except Exception:
+        # o job não chegou ao executor: devolve a vaga (quem libera é run_import_job)
+        conn.rollback()
+        with _import_jobs_lock:
+            _import_jobs_local.pop(job_id, None)
+        _import_slots.release()
+        raise
+    return job_id, future
+
+
+def get_import_job(job_id: str):
+    """
+    Estado do job (dict) ou None. Contadores ao vivo quando o job roda neste worker.
+    Job em andamento sem atualização há IMPORT_JOB_STALE_SECONDS vira 'failed'.
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM import_jobs WHERE job_id = ?", (job_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    job = dict(row)
+    job["errors"] = json.loads(job["errors"]) if job["errors"] else []
+    with _import_jobs_lock:
+        live = dict(_import_jobs_local.get(job_id, {}))
+    live.pop("errors", None)
+    job.update(live)
+
+    cutoff = (dt.datetime.utcnow() - dt.timedelta(seconds=IMPORT_JOB_STALE_SECONDS)).isoformat(timespec="seconds")
+    if not live and job["status"] not in ("done", "failed") and job["updated_at"] < cutoff:
+        errors = ["Importação interrompida (o servidor reiniciou no meio), envie o arquivo de novo"]
+        wconn = get_write_db()
+        try:
+            marked = wconn.execute("""
+              UPDATE import_jobs SET status = 'failed', errors = ?, updated_at = ?
+              WHERE job_id = ? AND status NOT IN ('done', 'failed') AND updated_at < ?
+            """, (json.dumps(errors, ensure_ascii=False), dt.datetime.utcnow().isoformat(timespec="seconds"),
+                  job_id, cutoff)).rowcount
+            wconn.commit()
+        except Exception:
+            wconn.rollback()
+            raise
+        # 0 linhas: o job andou entre a leitura e o UPDATE, a próxima consulta mostra
+        if marked:
+            job["status"] = "failed"
+            job["errors"] = errors
+    return job
+
+
+# =========================
+# Bulk import (vários arquivos)
+# =========================
+BULK_MONTH_IN_FILENAME = re.compile(r"(20\d{2})[-_. ]?(0[1-9]|1[0-2])(?!\d)")
+
+
+def month_ref_from_filename(filename: str):
+    """YYYYMM no nome do arquivo (ex: fatura_2024-03.xlsx, 202403.xlsx) ou None."""
+    m = BULK_MONTH_IN_FILENAME.search(os.path.basename(filename or ""))
+    return f"{m.group(1)}{m.group(2)}" if m else None
+
+
+def _parse_and_validate_file(raw: bytes, uploaded_by: str):
+    # roda nos processos do pool: nada de banco aqui
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        return normalize_and_validate_template(read_template_xlsx_from_bytes(raw), uploaded_by)
+    except ValueError as e:
+        return [str(e)], []
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError, SyntaxError) as e:
+        # arquivo corrompido ou que não é .xlsx (zip sem workbook, XML quebrado):
+        # invalida só este arquivo, os outros do lote seguem
+        return [f"Arquivo não é uma planilha .xlsx válida ({type(e).__name__})"], []
+
+
+def find_imported_hashes(uploaded_by: str, keys: list[tuple[str, str]]) -> set:
+    """Quais (month_ref, file_hash) já foram importados pelo perfil, numa query só."""
+    if not keys:
+        return set()
+    hashes = sorted({h for _, h in keys})
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(f"""
+      SELECT month_ref, file_hash
+      FROM imports
+      WHERE uploaded_by = ?
+        AND status = 'imported'
+        AND file_hash IN ({", ".join("?" * len(hashes))})
+    """, (uploaded_by, *hashes))
+    return {(r["month_ref"], r["file_hash"]) for r in cur.fetchall()} & set(keys)
+
+
+def bulk_import_files(files: list[tuple[str, bytes]], uploaded_by: str, default_month_ref: str = None) -> list[dict]:
+    """
+    Importa vários arquivos do template direto como 'imported' (sem preview).
+    Mês de cada arquivo: YYYYMM no nome, senão default_month_ref.
+    Lê/valida em paralelo (processos), pula duplicados e meses fechados,
+    e grava todos os batches válidos numa transação só.
+    Linhas já importadas (mesmo fingerprint) são puladas.
+    Retorna um resultado por arquivo: filename, month_ref, status, rows, skipped, errors.
+    """
+    results = []
+    pending = []
+    for filename, raw in files:
+        res = {"filename": filename, "month_ref": month_ref_from_filename(filename) or default_month_ref,
+               "file_hash": compute_file_hash(raw), "status": "", "rows": 0, "skipped": 0, "errors": []}
+        results.append(res)
+        if not res["month_ref"]:
+            res["status"] = "invalid"
+            res["errors"] = ["Mês não encontrado no nome do arquivo (use YYYYMM)"]
+        elif is_month_locked(res["month_ref"], uploaded_by):
+            res["status"] = "locked"
+        else:
+            pending.append((res, raw))
+
+    # duplicados: já importados antes ou repetidos neste mesmo lote
+    seen = find_imported_hashes(uploaded_by, [(r["month_ref"], r["file_hash"]) for r, _ in pending])
+    unique = []
+    for res, raw in pending:
+        key = (res["month_ref"], res["file_hash"])
+        if key in seen:
+            res["status"] = "duplicate"
+            continue
+        seen.add(key)
+        unique.append((res, raw))
+
+    processes = BULK_IMPORT_PROCESSES or os.cpu_count() or 1
+    if len(unique) > 1 and processes > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(unique))) as pool:
+            parsed = list(pool.map(_parse_and_validate_file, [raw for _, raw in unique], [uploaded_by] * len(unique)))
+    else:
+        parsed = [_parse_and_validate_file(raw, uploaded_by) for _, raw in unique]
+
+    to_write = []
+    for (res, _), (errors, rows) in zip(unique, parsed):
+        if errors:
+            res["status"] = "invalid"
+            res["errors"] = errors
+        else:
+            to_write.append((res, rows))
+
+    if to_write:
+        now = dt.datetime.utcnow().isoformat(timespec="seconds")
+        conn = get_db()
+        try:
+            for res, rows in to_write:
+                batch_id = uuid.uuid4().hex
+                add_row_fingerprints(rows, uploaded_by, res["month_ref"])
+                params = [_transaction_params(batch_id, res["month_ref"], uploaded_by, r, now) for r in rows]
+                _insert_import(conn, batch_id, res["month_ref"], uploaded_by, res["filename"], len(rows),
+                               "imported", now, res["file_hash"], "template_xlsx")
+                inserted = _insert_transactions(conn, params, or_ignore=True)
+                if inserted != len(rows):
+                    conn.execute("UPDATE imports SET row_count = ? WHERE batch_id = ?", (inserted, batch_id))
+                res["status"] = "imported"
+                res["rows"] = inserted
+                res["skipped"] = len(rows) - inserted
+            bump_month_version(conn, *[res["month_ref"] for res, _ in to_write])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return results
+
+
+BULK_STATUS_LABELS = {
+    "imported": "Importado",
+    "duplicate": "Já importado",
+    "locked": "Mês fechado",
+    "invalid": "Com erros",
+}
+
+
+@app.cli.command("import-dir")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--profile", required=True, type=click.Choice(sorted(ALLOWED_PROFILES)), help="Perfil dono dos arquivos")
+@click.option("--month", "month_ref", default=None, help="YYYYMM para arquivos sem mês no nome")
+def import_dir_command(directory, profile, month_ref):
+    """Importa todos os .xlsx de DIRECTORY (backfill), direto sem preview."""
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(".xlsx") and not name.startswith("~$")
+    )
+    files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+
+    started = time.perf_counter()
+    results = bulk_import_files(files, profile, month_ref)
+    for r in results:
+        click.echo(f"{r['filename']}: {BULK_STATUS_LABELS[r['status']]} ({r['month_ref'] or '-'}, {r['rows']} linhas, {r['skipped']} repetidas)")
+        for e in r["errors"][:5]:
+            click.echo(f"    {e}")
+    imported = sum(1 for r in results if r["status"] == "imported")
+    click.echo(f"{imported}/{len(results)} arquivos importados em {time.perf_counter() - started:.1f}s")
 
 
 # =========================
 # Computations
 # =========================
+class VersionedLRU:
+    """
+    LRU limitado, por processo. Cada chave guarda (versão do mês, valor):
+    versão diferente conta como miss e o valor é recalculado e substituído.
+    Os valores são compartilhados entre requests: quem recebe não deve alterar.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, version: int, compute):
+        if not self.maxsize:
+            return compute()
+        with self._lock:
+            cached = self._data.get(key)
+            if cached is not None and cached[0] == version:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        # calcula fora do lock; dois requests no mesmo miss só calculam em dobro
+        value = compute()
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+summary_cache = VersionedLRU(SUMMARY_CACHE_SIZE)
+
+
+class SharedSummaryCache:
+    """
+    Resumos calculados, visíveis para todos os workers, num SQLite à parte
+    (escrever aqui não disputa o lock do banco principal, nem em GET).
+    Vale se versão do mês e build do código batem e o TTL não passou.
+    Qualquer erro do arquivo de cache só vira miss: a página nunca depende dele.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=1)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("""
+          CREATE TABLE IF NOT EXISTS summary_cache (
+            cache_key TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            build TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+          )
+        """)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str, version: int):
+        try:
+            row = self._conn().execute("""
+              SELECT payload FROM summary_cache
+              WHERE cache_key = ? AND version = ? AND build = ? AND created_at >= ?
+            """, (key, version, APP_BUILD, time.time() - self.ttl_seconds)).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            app.logger.warning("cache compartilhado indisponível: %s", e)
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, version: int, value):
+        now = time.time()
+        try:
+            conn = self._conn()
+            with conn:
+                # nunca troca uma versão mais nova por uma mais velha (workers em corrida)
+                conn.execute("""
+                  INSERT INTO summary_cache (cache_key, version, build, payload, created_at)
+                  VALUES (?, ?, ?, ?, ?)
+                  ON CONFLICT (cache_key) DO UPDATE SET
+                    version = excluded.version, build = excluded.build,
+                    payload = excluded.payload, created_at = excluded.created_at
+                  WHERE excluded.version >= summary_cache.version OR excluded.build <> summary_cache.build
+                """, (key, version, APP_BUILD, json.dumps(value), now))
+                conn.execute("DELETE FROM summary_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        except sqlite3.Error as e:
+            self.errors += 1
+            app.logger.warning("cache compartilhado indisponível: %s", e)
+
+    def get_or_compute(self, key: str, version: int, compute):
+        if not self.path or self.ttl_seconds <= 0:
+            return compute()
+        value = self.get(key, version)
+        if value is None:
+            value = compute()
+            self.put(key, version, value)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+shared_summary_cache = SharedSummaryCache(SUMMARY_SHARED_DB, SUMMARY_SHARED_TTL_SECONDS)
+
+
+def cached_summary(key: tuple, version: int, compute):
+    """LRU do processo na frente, cache compartilhado atrás, cálculo por último."""
+    return summary_cache.get_or_compute(
+        key, version,
+        lambda: shared_summary_cache.get_or_compute(":".join(key), version, compute),
+    )
+
+
+# Mesmo critério de signed_value(), em SQL
+SIGNED_VALOR_SQL = "(CASE WHEN t.tipo = 'Entrada' THEN -ABS(t.valor) ELSE ABS(t.valor) END)"
+
+
+def fetch_house_totals_by_category(month_ref: str):
+    """
+    Totais da Casa por categoria, lidos de month_category_summary.
+    first_id preserva a ordem de primeira aparição (desempate do sort).
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(f"""
+      SELECT
+        s.cat AS cat,
+        {_summary_bound_sql("MIN", "first_id")} AS first_id,
+        s.total AS total,
+        s.paid_lucas AS lucas,
+        s.paid_rafa AS rafa,
+        s.total_6040 * :lucas_share + s.total_5050 * 0.5 AS expected_lucas,
+        s.total_6040 * :rafa_share + s.total_5050 * 0.5 AS expected_rafa
+      FROM month_category_summary s
+      WHERE s.month_ref = :month_ref AND s.profile = '' AND s.kind = 'casa'
+      ORDER BY first_id ASC
+    """, {"month_ref": month_ref, "lucas_share": LUCAS_SHARE, "rafa_share": RAFA_SHARE})
+    return cur.fetchall()
+
+
 def compute_casa(month_ref: str):
-    rows = fetch_house_transactions(month_ref)
+    # versão lida antes do cálculo: no pior caso o valor guardado é mais novo que a chave
+    version = get_month_version(month_ref)
+    return cached_summary(("casa", month_ref), version, lambda: _compute_casa(month_ref))
+
+
+def _compute_casa(month_ref: str):
+    groups = fetch_house_totals_by_category(month_ref)
 
     total_casa = 0.0
     paid_lucas = 0.0
@@ -1007,29 +2616,13 @@ def compute_casa(month_ref: str):
 
     by_category = {}
 
-    for r in rows:
-        val = signed_value(r["tipo"], r["valor"])
-        total_casa += val
-
-        cat = r["categoria"] or "Sem categoria"
-        if cat not in by_category:
-            by_category[cat] = {"total": 0.0, "lucas": 0.0, "rafa": 0.0}
-        by_category[cat]["total"] += val
-
-        pagador_real = r["pagador_real"] or r["uploaded_by"]
-        if pagador_real == "Lucas":
-            paid_lucas += val
-            by_category[cat]["lucas"] += val
-        elif pagador_real == "Rafa":
-            paid_rafa += val
-            by_category[cat]["rafa"] += val
-
-        if r["rateio_display"] == "60/40":
-            expected_lucas += val * LUCAS_SHARE
-            expected_rafa += val * RAFA_SHARE
-        elif r["rateio_display"] == "50/50":
-            expected_lucas += val * 0.5
-            expected_rafa += val * 0.5
+    for r in groups:
+        total_casa += r["total"]
+        paid_lucas += r["lucas"]
+        paid_rafa += r["rafa"]
+        expected_lucas += r["expected_lucas"]
+        expected_rafa += r["expected_rafa"]
+        by_category[r["cat"]] = {"total": r["total"], "lucas": r["lucas"], "rafa": r["rafa"]}
 
     lucas_diff = paid_lucas - expected_lucas
     rafa_diff = paid_rafa - expected_rafa
@@ -1058,53 +2651,84 @@ def compute_casa(month_ref: str):
     }
 
 
-def compute_individual(month_ref: str, profile: str):
-    rows = fetch_imported_transactions(month_ref)
-
-    house_by_cat = {}
-    house_total = 0.0
-
-    my_personal_by_cat = {}
-    my_personal_total = 0.0
+def fetch_individual_summary(month_ref: str, profile: str):
+    """
+    Uma ida ao banco: renda + investimento do perfil e os totais do mês por
+    (kind, categoria), lidos de month_category_summary. kind segue a mesma ordem
+    de decisão do compute_individual original (casa, pessoal, a receber, a pagar).
+    Sempre retorna pelo menos uma linha (kind NULL quando o mês está vazio).
+    """
+    if profile not in SUMMARY_PROFILES:
+        # perfil fora dos resumos materializados: só a renda / investimento
+        grouped = "SELECT NULL AS kind, NULL AS cat, NULL AS last_id, NULL AS total WHERE 0"
+    else:
+        grouped = f"""
+        SELECT
+          s.kind AS kind,
+          s.cat AS cat,
+          {_summary_bound_sql("MAX", "last_id")} AS last_id,
+          CASE WHEN s.kind = 'house' THEN s.total_6040 * :share_6040 + s.total_5050 * 0.5 ELSE s.total END AS total
+        FROM month_category_summary s
+        WHERE s.month_ref = :month_ref AND s.profile = :profile
+        """
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(f"""
+      WITH grouped AS ({grouped})
+      SELECT
+        inc.salario_1, inc.salario_2, inc.extras,
+        inv.amount AS invest_amount, inv.note AS invest_note,
+        g.kind, g.cat, g.total
+      FROM (SELECT 1) base
+      LEFT JOIN incomes inc ON inc.month_ref = :month_ref AND inc.profile = :profile
+      LEFT JOIN investments inv ON inv.month_ref = :month_ref AND inv.profile = :profile
+      LEFT JOIN grouped g ON 1 = 1
+      ORDER BY g.last_id DESC
+    """, {
+        "month_ref": month_ref,
+        "profile": profile,
+        "share_6040": share_for_profile(profile, "60/40"),
+    })
+    return cur.fetchall()
 
-    receivable_total = 0.0
-    payable_total = 0.0
 
-    for r in rows:
-        val = signed_value(r["tipo"], r["valor"])
-        cat = r["categoria"] or "Sem categoria"
+def compute_individual(month_ref: str, profile: str):
+    version = get_month_version(month_ref)
+    return cached_summary(("individual", month_ref, profile), version, lambda: _compute_individual(month_ref, profile))
 
-        dono = r["dono"] or ""
-        rateio = r["rateio_display"] or ""
 
-        # Casa share
-        if dono == "Casa" and rateio in ("60/40", "50/50"):
-            sh = share_for_profile(profile, rateio)
-            part = val * sh
-            house_total += part
-            house_by_cat[cat] = house_by_cat.get(cat, 0.0) + part
-            continue
+def _compute_individual(month_ref: str, profile: str):
+    summary = fetch_individual_summary(month_ref, profile)
 
-        # Personal
-        if dono == profile:
-            my_personal_total += val
-            my_personal_by_cat[cat] = my_personal_by_cat.get(cat, 0.0) + val
-            continue
+    house_by_cat = {}
+    house_total = 0.0
 
-        # Debts/receivables: when dono is the other, it means "this was for the other"
-        # We interpret:
-        # - if I uploaded and dono is other => I paid for them => receivable
-        # - if other uploaded and dono is me => they paid for me => payable
-        if r["uploaded_by"] == profile and dono in {"Lucas", "Rafa"} and dono != profile:
-            receivable_total += val
-            continue
+    my_personal_by_cat = {}
+    my_personal_total = 0.0
 
-        if r["uploaded_by"] != profile and dono == profile:
-            payable_total += val
-            continue
+    receivable_total = 0.0
+    payable_total = 0.0
 
-    income = get_income(month_ref, profile)
-    inv = get_investment(month_ref, profile)
+    # ordem de last_id DESC = mesma ordem de inserção dos dicts no loop antigo (t.id DESC)
+    for r in summary:
+        kind = r["kind"]
+        if kind == "house":
+            house_total += r["total"]
+            house_by_cat[r["cat"]] = r["total"]
+        elif kind == "personal":
+            my_personal_total += r["total"]
+            my_personal_by_cat[r["cat"]] = r["total"]
+        elif kind == "receivable":
+            receivable_total += r["total"]
+        elif kind == "payable":
+            payable_total += r["total"]
+
+    head = summary[0]
+    s1 = float(head["salario_1"] or 0)
+    s2 = float(head["salario_2"] or 0)
+    ex = float(head["extras"] or 0)
+    income = {"salario_1": s1, "salario_2": s2, "extras": ex, "total": s1 + s2 + ex}
+    inv = {"amount": float(head["invest_amount"] or 0), "note": head["invest_note"] or ""}
     invested = float(inv["amount"] or 0)
 
     expenses_effective = house_total + my_personal_total + payable_total
@@ -1135,6 +2759,402 @@ def compute_individual(month_ref: str, profile: str):
     }
 
 
+# =========================
+# Resumos materializados (month_category_summary)
+# =========================
+# Mantidos por triggers em transactions: todo writer (import, exclusão, manual,
+# bulk, fixos) atualiza os resumos na mesma transação, por deltas.
+# Somas guardadas em centavos (ROUND 2): o valor não depende da ordem de
+# inserções/exclusões, então delta e rebuild dão exatamente o mesmo número.
+SUMMARY_PROFILES = tuple(sorted(ALLOWED_PROFILES))
+
+SUMMARY_TRIGGER_COLUMNS = "id, month_ref, categoria, dono, rateio_display, pagador_real, uploaded_by, tipo, valor"
+
+SUMMARY_SUM_COLUMNS = ("total", "total_6040", "total_5050", "paid_lucas", "paid_rafa")
+
+
+def _summary_contrib_sql(src: str) -> str:
+    """
+    Contribuição de cada transação de src (alias t) para os resumos: uma linha
+    kind 'casa' (perfil '') quando entra no acerto da Casa e, por perfil, o kind
+    de compute_individual (house, personal, receivable, payable), na mesma ordem de decisão.
+    """
+    house = "t.dono = 'Casa' AND t.rateio_display IN ('60/40','50/50')"
+    base = f"""
+          t.id AS id,
+          t.month_ref AS month_ref,
+          COALESCE(NULLIF(t.categoria, ''), 'Sem categoria') AS cat,
+          ROUND({SIGNED_VALOR_SQL}, 2) AS val,
+          t.rateio_display AS rateio,
+          COALESCE(NULLIF(t.pagador_real, ''), t.uploaded_by) AS payer"""
+    parts = [f"SELECT {base}, '' AS profile, CASE WHEN {house} THEN 'casa' END AS kind FROM {src}"]
+    for p in SUMMARY_PROFILES:
+        parts.append(f"""SELECT {base}, '{p}' AS profile, CASE
+            WHEN {house} THEN 'house'
+            WHEN t.dono = '{p}' THEN 'personal'
+            WHEN t.uploaded_by = '{p}' AND t.dono IN ('Lucas','Rafa') AND t.dono <> '{p}' THEN 'receivable'
+            WHEN t.uploaded_by <> '{p}' AND t.dono = '{p}' THEN 'payable'
+          END AS kind FROM {src}""")
+    return "SELECT * FROM (" + "\n UNION ALL ".join(parts) + ") WHERE kind IS NOT NULL"
+
+
+# colunas somadas a partir de uma contribuição c
+_SUMMARY_CONTRIB_VALUES = """
+  c.val,
+  CASE c.rateio WHEN '60/40' THEN c.val ELSE 0 END,
+  CASE c.rateio WHEN '50/50' THEN c.val ELSE 0 END,
+  CASE c.payer WHEN 'Lucas' THEN c.val ELSE 0 END,
+  CASE c.payer WHEN 'Rafa' THEN c.val ELSE 0 END"""
+
+
+def _summary_grouped_sql(src: str) -> str:
+    # resumos do zero a partir de src (rebuild e verificação)
+    sums = ", ".join(f"ROUND(SUM(v{i}), 2)" for i in range(len(SUMMARY_SUM_COLUMNS)))
+    vals = ", ".join(
+        f"{expr.strip()} AS v{i}" for i, expr in enumerate(_SUMMARY_CONTRIB_VALUES.strip().split(",\n"))
+    )
+    return f"""
+      SELECT month_ref, profile, kind, cat, COUNT(*), MIN(id), MAX(id), {sums}
+      FROM (SELECT c.*, {vals} FROM ({_summary_contrib_sql(src)}) c)
+      GROUP BY month_ref, profile, kind, cat
+    """
+
+
+def month_summary_trigger_sql() -> list[str]:
+    def row(ref):
+        return "(SELECT " + ", ".join(f"{ref}.{col} AS {col}" for col in SUMMARY_TRIGGER_COLUMNS.split(", ")) + ") t"
+
+    cols = "month_ref, profile, kind, cat, n, first_id, last_id, " + ", ".join(SUMMARY_SUM_COLUMNS)
+    add = f"""
+        INSERT INTO month_category_summary ({cols})
+        SELECT c.month_ref, c.profile, c.kind, c.cat, 1, c.id, c.id, {_SUMMARY_CONTRIB_VALUES}
+        FROM ({_summary_contrib_sql(row("new"))}) c
+        WHERE true
+        ON CONFLICT (month_ref, profile, kind, cat) DO UPDATE SET
+          n = n + 1,
+          first_id = MIN(first_id, excluded.first_id),
+          last_id = MAX(last_id, excluded.last_id),
+          {", ".join(f"{col} = ROUND({col} + excluded.{col}, 2)" for col in SUMMARY_SUM_COLUMNS)};
+    """
+    # first_id/last_id que saem ficam NULL; refresh_summary_bounds recalcula uma vez por operação
+    sub_sets = ", ".join(
+        f"{col} = ROUND(month_category_summary.{col} - ({expr.strip()}), 2)"
+        for col, expr in zip(SUMMARY_SUM_COLUMNS, _SUMMARY_CONTRIB_VALUES.strip().split(",\n"))
+    )
+    sub = f"""
+        UPDATE month_category_summary SET
+          n = month_category_summary.n - 1,
+          first_id = CASE WHEN month_category_summary.first_id = c.id THEN NULL ELSE month_category_summary.first_id END,
+          last_id = CASE WHEN month_category_summary.last_id = c.id THEN NULL ELSE month_category_summary.last_id END,
+          {sub_sets}
+        FROM ({_summary_contrib_sql(row("old"))}) c
+        WHERE month_category_summary.month_ref = c.month_ref
+          AND month_category_summary.profile = c.profile
+          AND month_category_summary.kind = c.kind
+          AND month_category_summary.cat = c.cat;
+        DELETE FROM month_category_summary WHERE month_ref = old.month_ref AND n <= 0;
+    """
+    watched = SUMMARY_TRIGGER_COLUMNS.replace("id, ", "", 1)
+    return [
+        "DROP TRIGGER IF EXISTS month_summary_ai",
+        "DROP TRIGGER IF EXISTS month_summary_ad",
+        "DROP TRIGGER IF EXISTS month_summary_au",
+        f"CREATE TRIGGER month_summary_ai AFTER INSERT ON transactions BEGIN {add} END",
+        f"CREATE TRIGGER month_summary_ad AFTER DELETE ON transactions BEGIN {sub} END",
+        f"CREATE TRIGGER month_summary_au AFTER UPDATE OF {watched} ON transactions BEGIN {sub} {add} END",
+    ]
+
+
+def rebuild_month_summaries(conn, month_refs=None):
+    """Recalcula os resumos do zero (todos os meses ou só month_refs). Não faz commit."""
+    cols = "month_ref, profile, kind, cat, n, first_id, last_id, " + ", ".join(SUMMARY_SUM_COLUMNS)
+    if month_refs is None:
+        conn.execute("DELETE FROM month_category_summary")
+        conn.execute(f"INSERT INTO month_category_summary ({cols}) {_summary_grouped_sql('transactions t')}")
+        return
+    for month_ref in sorted(set(month_refs)):
+        conn.execute("DELETE FROM month_category_summary WHERE month_ref = ?", (month_ref,))
+        conn.execute(
+            f"INSERT INTO month_category_summary ({cols}) "
+            f"{_summary_grouped_sql('(SELECT * FROM transactions WHERE month_ref = :month_ref) t')}",
+            {"month_ref": month_ref},
+        )
+
+
+def refresh_summary_bounds(conn, month_refs):
+    """Depois de excluir linhas: recalcula first_id/last_id que os triggers deixaram NULL."""
+    for month_ref in sorted(set(month_refs)):
+        conn.execute(f"""
+          UPDATE month_category_summary SET first_id = b.first_id, last_id = b.last_id
+          FROM (
+            SELECT profile, kind, cat, MIN(id) AS first_id, MAX(id) AS last_id
+            FROM ({_summary_contrib_sql("(SELECT * FROM transactions WHERE month_ref = :month_ref) t")})
+            GROUP BY profile, kind, cat
+          ) b
+          WHERE month_category_summary.month_ref = :month_ref
+            AND month_category_summary.profile = b.profile
+            AND month_category_summary.kind = b.kind
+            AND month_category_summary.cat = b.cat
+            AND (month_category_summary.first_id IS NULL OR month_category_summary.last_id IS NULL)
+        """, {"month_ref": month_ref})
+
+
+def _summary_bound_sql(agg: str, col: str) -> str:
+    # leitura: usa o limite guardado; se ficou NULL (exclusão sem refresh), calcula na hora
+    return f"""COALESCE(s.{col}, (
+          SELECT {agg}(c.id)
+          FROM ({_summary_contrib_sql("(SELECT * FROM transactions WHERE month_ref = s.month_ref) t")}) c
+          WHERE c.profile = s.profile AND c.kind = s.kind AND c.cat = s.cat
+        ))"""
+
+
+def check_month_summaries(conn, tolerance: float = 1e-6) -> list[dict]:
+    """
+    Recalcula tudo a partir de transactions e compara com month_category_summary.
+    Retorna as divergências (lista vazia = consistente).
+    """
+    keys = ("month_ref", "profile", "kind", "cat")
+    fields = ("n", "first_id", "last_id") + SUMMARY_SUM_COLUMNS
+    expected = {tuple(r[:4]): dict(zip(fields, r[4:])) for r in conn.execute(_summary_grouped_sql("transactions t"))}
+    actual = {
+        tuple(r[:4]): dict(zip(fields, r[4:]))
+        for r in conn.execute(f"SELECT {', '.join(keys + fields)} FROM month_category_summary")
+    }
+    diffs = []
+    for key in sorted(set(expected) | set(actual)):
+        exp, act = expected.get(key), actual.get(key)
+        if exp is None or act is None:
+            diffs.append({"key": key, "problem": "sobrando" if exp is None else "faltando"})
+            continue
+        for field in fields:
+            a, e = act[field], exp[field]
+            if field in ("first_id", "last_id") and a is None:
+                # limite pendente de refresh: a leitura calcula na hora
+                continue
+            same = (a == e) if field in ("n", "first_id", "last_id") else abs((a or 0) - (e or 0)) <= tolerance
+            if not same:
+                diffs.append({"key": key, "problem": field, "expected": e, "actual": a})
+    return diffs
+
+
+@app.cli.command("check-summaries")
+@click.option("--repair", is_flag=True, help="Reconstrói os resumos se houver divergência.")
+def check_summaries_command(repair):
+    """Confere month_category_summary contra transactions."""
+    conn = get_db()
+    diffs = check_month_summaries(conn)
+    for d in diffs[:50]:
+        click.echo(f"{'/'.join(d['key'])}: {d['problem']} (esperado {d.get('expected')}, gravado {d.get('actual')})")
+    if not diffs:
+        click.echo("Resumos consistentes")
+        return
+    click.echo(f"{len(diffs)} divergências")
+    if not repair:
+        sys.exit(1)
+    try:
+        rebuild_month_summaries(conn)
+        months = [r["month_ref"] for r in conn.execute("SELECT DISTINCT month_ref FROM transactions")]
+        # caches por versão (fragmento, LRU, compartilhado) passam a recalcular
+        bump_month_version(conn, *months)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    click.echo("Resumos reconstruídos")
+
+
+# =========================
+# Snapshots de meses fechados
+# =========================
+def casa_category_rows_html(data: dict) -> str:
+    rows = ""
+    for cat, obj in data["cats_sorted"]:
+        rows += f"""
+          <tr>
+            <td>{cat}</td>
+            <td class="right">{brl(obj["total"])}</td>
+            <td class="right">{brl(obj["lucas"])}</td>
+            <td class="right">{brl(obj["rafa"])}</td>
+          </tr>
+        """
+    if not rows:
+        rows = "<tr><td colspan='4' class='muted'>Sem lançamentos de Casa para esse mês</td></tr>"
+    return rows
+
+
+def category_value_rows_html(items) -> str:
+    out = ""
+    for cat, val in items:
+        out += f"<tr><td>{cat}</td><td class='right'>{brl(val)}</td></tr>"
+    if not out:
+        out = "<tr><td colspan='2' class='muted'>Sem dados</td></tr>"
+    return out
+
+
+# sobe quando muda o que vai no snapshot (campos do json, html das tabelas);
+# snapshots de outro formato são refeitos na próxima leitura
+SNAPSHOT_FORMAT = 1
+
+
+def refresh_month_snapshots(conn, month_ref: str):
+    """
+    Regrava os snapshots do mês para cada perfil que está com ele fechado
+    (resultados de compute_casa / compute_individual + tabelas já renderizadas).
+    O snapshot guarda a data_version e só é servido enquanto ela não muda
+    (o outro perfil ainda pode estar editando). Não faz commit.
+    """
+    locked_profiles = [
+        r["profile"] for r in conn.execute(
+            "SELECT profile FROM month_locks WHERE month_ref = ? AND is_locked = 1 ORDER BY profile", (month_ref,)
+        )
+    ]
+    snapshots = []
+    if locked_profiles:
+        # versão lida antes do cálculo: escrita no meio deixa o snapshot vencido, nunca errado
+        row = get_db().execute("SELECT data_version FROM month_versions WHERE month_ref = ?", (month_ref,)).fetchone()
+        data_version = int(row["data_version"]) if row else 0
+        now = dt.datetime.utcnow().isoformat(timespec="seconds")
+        casa = _compute_casa(month_ref)
+        for profile in locked_profiles:
+            individual = _compute_individual(month_ref, profile)
+            snapshots.append((
+                month_ref, profile, data_version, SNAPSHOT_FORMAT, json.dumps(casa), json.dumps(individual),
+                casa_category_rows_html(casa),
+                category_value_rows_html(individual["cats_house"]),
+                category_value_rows_html(individual["cats_personal"]),
+                now,
+            ))
+
+    conn.execute("DELETE FROM month_snapshots WHERE month_ref = ?", (month_ref,))
+    conn.executemany("""
+      INSERT INTO month_snapshots
+      (month_ref, profile, data_version, format, casa_json, individual_json,
+       casa_rows_html, house_rows_html, personal_rows_html, created_at)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, snapshots)
+
+
+def _read_month_snapshot(conn, month_ref: str, profile: str):
+    row = conn.execute("""
+      SELECT s.* FROM month_snapshots s
+      WHERE s.month_ref = ? AND s.profile = ? AND s.format = ?
+        AND s.data_version = COALESCE((SELECT data_version FROM month_versions WHERE month_ref = s.month_ref), 0)
+    """, (month_ref, profile, SNAPSHOT_FORMAT)).fetchone()
+    if row is None:
+        return None
+    return {
+        "casa": json.loads(row["casa_json"]),
+        "individual": json.loads(row["individual_json"]),
+        "casa_rows_html": row["casa_rows_html"],
+        "house_rows_html": row["house_rows_html"],
+        "personal_rows_html": row["personal_rows_html"],
+    }
+
+
+def get_month_snapshot(month_ref: str, profile: str):
+    """
+    Snapshot do mês fechado para o perfil; None se o mês está aberto.
+    Vencido (dados do mês mudaram, SNAPSHOT_FORMAT novo) é refeito aqui, pela
+    conexão de escrita: só a primeira leitura depois da mudança recalcula.
+    """
+    snap = _read_month_snapshot(get_db(), month_ref, profile)
+    if snap is not None or not is_month_locked(month_ref, profile):
+        return snap
+    conn = get_write_db()
+    try:
+        refresh_month_snapshots(conn, month_ref)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return _read_month_snapshot(conn, month_ref, profile)
+
+
+# =========================
+# Busca (FTS, todos os meses)
+# =========================
+SEARCH_PAGE_SIZE = 50
+
+
+def _parse_search_cursor(after: str):
+    # cursor = "score:id" do último resultado da página anterior
+    try:
+        score, last_id = after.split(":", 1)
+        return float(score), int(last_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def search_transactions(query: str, uploaded_by: str = "", categoria: str = "",
+                        min_valor=None, max_valor=None, after: str = "",
+                        limit: int = SEARCH_PAGE_SIZE):
+    """
+    Busca em descricao / categoria / observacao de todos os meses.
+    Ordem: relevância (bm25, menor = melhor) e, no empate, mais recente primeiro.
+    Paginação por keyset: devolve (rows, cursor da próxima página ou None).
+    """
+    fts_q = fts_prefix_query(query or "")
+    if not fts_q:
+        return [], None
+
+    where = ["transactions_fts MATCH ?"]
+    params = [fts_q]
+    if uploaded_by:
+        where.append("t.uploaded_by = ?")
+        params.append(uploaded_by)
+    if categoria:
+        where.append("t.categoria = ?")
+        params.append(categoria)
+    if min_valor is not None:
+        where.append("t.valor >= ?")
+        params.append(float(min_valor))
+    if max_valor is not None:
+        where.append("t.valor <= ?")
+        params.append(float(max_valor))
+
+    # score arredondado: o mesmo documento sempre gera o mesmo valor e o keyset compara com "="
+    keyset = ""
+    cursor = _parse_search_cursor(after) if after else None
+    if cursor:
+        keyset = "WHERE score > ? OR (score = ? AND id < ?)"
+
+    sql = f"""
+      WITH hits AS (
+        SELECT t.id, t.month_ref, t.uploaded_by, t.dt_text, t.descricao, t.categoria,
+               t.valor, t.tipo, t.dono, t.observacao,
+               ROUND(bm25(transactions_fts, 10.0, 2.0, 1.0), 6) AS score
+        FROM transactions_fts
+        JOIN transactions t ON t.id = transactions_fts.rowid
+        WHERE {" AND ".join(where)}
+      )
+      SELECT * FROM hits
+      {keyset}
+      ORDER BY score, id DESC
+      LIMIT ?
+    """
+    if cursor:
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    params.append(limit + 1)
+
+    conn = get_db()
+    cur = conn.cursor()
+    started = time.perf_counter()
+    try:
+        cur.execute(sql, params)
+    except sqlite3.OperationalError as e:
+        # consulta FTS malformada não deve virar 500
+        app.logger.info("busca inválida %r: %s", query, e)
+        return [], None
+    rows = cur.fetchall()
+    app.logger.debug("busca %r: %d resultados em %.1f ms", query, len(rows), (time.perf_counter() - started) * 1000)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['score']}:{rows[-1]['id']}"
+    return rows, next_cursor
+
+
 # =========================
 # Manual entries (Extras within app + repetition)
 # =========================
@@ -1147,9 +3167,6 @@ def create_manual_rows(month_ref: str, uploaded_by: str, base_row: dict, repeat_
     batch_id = uuid.uuid4().hex
     now = dt.datetime.utcnow().isoformat(timespec="seconds")
 
-    conn = get_db()
-    _insert_import(conn, batch_id, month_ref, uploaded_by, "manual_entry", 0, "imported", now, None, "manual")
-
     def add_months(yyyymm: str, add: int) -> str:
         y = int(yyyymm[:4])
         m = int(yyyymm[4:])
@@ -1160,19 +3177,23 @@ def create_manual_rows(month_ref: str, uploaded_by: str, base_row: dict, repeat_
         mm = mm % 12 + 1
         return f"{yy}{mm:02d}"
 
-    rows_created = 0
-    for i in range(max(1, repeat_months)):
-        mr = add_months(month_ref, i)
-        r = dict(base_row)
-        r["Observacao"] = _normalize_str(r.get("Observacao", ""))
-        # Keep same row but in different month_ref
-        _insert_transaction(conn, batch_id, mr, uploaded_by, r, now)
-        rows_created += 1
+    r = dict(base_row)
+    r["Observacao"] = _normalize_str(r.get("Observacao", ""))
+    # Keep same row but in different month_ref
+    params = [
+        _transaction_params(batch_id, add_months(month_ref, i), uploaded_by, r, now)
+        for i in range(max(1, repeat_months))
+    ]
 
-    cur = conn.cursor()
-    cur.execute("UPDATE imports SET row_count = ? WHERE batch_id = ?", (rows_created, batch_id))
-    conn.commit()
-    conn.close()
+    conn = get_db()
+    try:
+        _insert_import(conn, batch_id, month_ref, uploaded_by, "manual_entry", len(params), "imported", now, None, "manual")
+        _insert_transactions(conn, params)
+        bump_month_version(conn, *[p[1] for p in params])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     return batch_id
 
 
@@ -1231,6 +3252,32 @@ def download_template():
     )
 
 
+@app.route("/import-jobs/<job_id>")
+def import_job_status(job_id: str):
+    profile = session.get("profile", "")
+    if not profile:
+        return jsonify({"error": "Perfil não selecionado"}), 401
+    job = get_import_job(job_id)
+    if not job or job["uploaded_by"] != profile:
+        return jsonify({"error": "Importação não encontrada"}), 404
+    return jsonify({
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "parsed": job["parsed"],
+        "validated": job["validated"],
+        "inserted": job["inserted"],
+        "batch_id": job["batch_id"],
+        "errors": job["errors"][:TEMPLATE_ERRORS_SHOWN],
+    })
+
+
+@app.route("/cache-stats")
+def cache_stats():
+    if not session.get("profile"):
+        return jsonify({"error": "Perfil não selecionado"}), 401
+    return jsonify({"pid": os.getpid(), "summary": summary_cache.stats(), "shared": shared_summary_cache.stats()})
+
+
 @app.post("/toggle-month-lock")
 def toggle_month_lock():
     profile = session.get("profile", "")
@@ -1262,6 +3309,11 @@ def dashboard():
     selected_month = request.args.get("Mes") or f"{now_m:02d}"
     month_ref = month_ref_from(selected_year, selected_month)
 
+    etag = month_page_etag(month_ref, profile)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
     label_renda = "Renda do Lucas" if profile == "Lucas" else "Renda da Rafa"
     locked = is_month_locked(month_ref, profile)
 
@@ -1299,7 +3351,7 @@ def dashboard():
       </body>
     </html>
     """
-    return html
+    return with_etag(html, etag)
 
 
 @app.route("/renda", methods=["GET", "POST"])
@@ -1313,6 +3365,11 @@ def renda():
     selected_month = request.values.get("Mes") or f"{now_m:02d}"
     month_ref = month_ref_from(selected_year, selected_month)
 
+    etag = month_page_etag(month_ref, profile)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
     msg = ""
     if request.method == "POST":
         def num(v):
@@ -1393,7 +3450,7 @@ def renda():
       </body>
     </html>
     """
-    return html
+    return with_etag(html, etag)
 
 
 @app.route("/individual", methods=["GET", "POST"])
@@ -1407,6 +3464,11 @@ def individual():
     selected_month = request.values.get("Mes") or f"{now_m:02d}"
     month_ref = month_ref_from(selected_year, selected_month)
 
+    etag = month_page_etag(month_ref, profile)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
     invest_msg = ""
     if request.method == "POST":
         def num(v):
@@ -1423,15 +3485,15 @@ def individual():
         upsert_investment(month_ref, profile, amount, note)
         invest_msg = "Investimento salvo"
 
-    data = compute_individual(month_ref, profile)
-
-    def rows_from(items):
-        out = ""
-        for cat, val in items:
-            out += f"<tr><td>{cat}</td><td class='right'>{brl(val)}</td></tr>"
-        if not out:
-            out = "<tr><td colspan='2' class='muted'>Sem dados</td></tr>"
-        return out
+    snap = get_month_snapshot(month_ref, profile)
+    if snap:
+        data = snap["individual"]
+        house_rows = snap["house_rows_html"]
+        personal_rows = snap["personal_rows_html"]
+    else:
+        data = compute_individual(month_ref, profile)
+        house_rows = category_value_rows_html(data["cats_house"])
+        personal_rows = category_value_rows_html(data["cats_personal"])
 
     invest_block = ""
     if invest_msg:
@@ -1537,7 +3599,7 @@ def individual():
             <h3>Minha parte da casa por categoria</h3>
             <table>
               <thead><tr><th>Categoria</th><th class="right">Valor</th></tr></thead>
-              <tbody>{rows_from(data["cats_house"])}</tbody>
+              <tbody>{house_rows}</tbody>
             </table>
           </div>
 
@@ -1545,7 +3607,7 @@ def individual():
             <h3>Meu pessoal por categoria</h3>
             <table>
               <thead><tr><th>Categoria</th><th class="right">Valor</th></tr></thead>
-              <tbody>{rows_from(data["cats_personal"])}</tbody>
+              <tbody>{personal_rows}</tbody>
             </table>
           </div>
 
@@ -1553,7 +3615,7 @@ def individual():
       </body>
     </html>
     """
-    return html
+    return with_etag(html, etag)
 
 
 @app.route("/gastos", methods=["GET", "POST"])
@@ -1567,6 +3629,12 @@ def gastos():
     selected_month = request.values.get("Mes") or f"{now_m:02d}"
     month_ref = month_ref_from(selected_year, selected_month)
 
+    # acompanhamento de job muda sem escrita no mês: sem ETag
+    etag = None if request.args.get("job") else month_page_etag(month_ref, profile)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
     # Ensure fixed always present
     ensure_fixed_rows(month_ref)
 
@@ -1580,6 +3648,8 @@ def gastos():
 
     preview_rows = []
     preview_batch_id = ""
+    import_job = None
+    cross_matches = []
 
     # dropdown options
     pagador_opts = "".join([f"<option value='{p}'>{p}</option>" for p in ["Lucas", "Rafa", "Casa"]])
@@ -1658,27 +3728,100 @@ def gastos():
                         raw = file.read()
                         file_hash = compute_file_hash(raw)
 
-                        if is_duplicate_import(month_ref, profile, file_hash):
+                        split_by_date = request.form.get("split_by_date") == "1"
+
+                        if not split_by_date and is_duplicate_import(month_ref, profile, file_hash):
                             errors.append("Esse mesmo arquivo já foi importado neste mês para este perfil")
                         else:
-                            df = read_template_xlsx_from_bytes(raw)
-                            errors, preview_rows = normalize_and_validate_template(df, profile)
-                            if not errors:
-                                preview_batch_id = create_preview_batch(month_ref, profile, file.filename, preview_rows, file_hash)
-                                info = "Preview criado, confirme para importar"
-                                info_ok = True
+                            job_id, future = submit_import_job(month_ref, profile, file.filename, raw, file_hash, split_by_date)
+                            if not job_id:
+                                errors.append("Muitas importações em andamento, tente de novo em instantes")
+                            else:
+                                # arquivo pequeno termina aqui; grande segue em background
+                                wait_futures([future], timeout=IMPORT_INLINE_WAIT_SECONDS)
+                                import_job = get_import_job(job_id)
                     except Exception as e:
                         errors.append(str(e))
 
             elif action == "excel_import":
-                batch_id = _normalize_str(request.form.get("batch_id"))
-                ok, msg = finalize_import(batch_id, profile)
-                info = msg
-                info_ok = ok
+                # um ou vários batches (separados por vírgula quando o arquivo foi dividido por mês)
+                batch_ids = [b for b in _normalize_str(request.form.get("batch_id")).split(",") if b]
+                info_ok, info = finalize_import(batch_ids, profile)
+
+    # volta da tela de progresso (?job=<id>)
+    if request.method == "GET" and request.args.get("job"):
+        import_job = get_import_job(_normalize_str(request.args.get("job")))
+        if import_job and import_job["uploaded_by"] != profile:
+            import_job = None
+
+    job_block = ""
+    if import_job:
+        if import_job["status"] == "done":
+            preview_batch_id = import_job["batch_id"] or ""
+            batch_ids = [b for b in preview_batch_id.split(",") if b]
+            preview_rows = fetch_preview_rows(batch_ids) if batch_ids else []
+            if preview_rows:
+                months = fetch_preview_months(batch_ids)
+                info = "Preview criado, confirme para importar"
+                if len(months) > 1:
+                    info += " (" + ", ".join(f"{m['month_ref']}: {m['row_count']} linhas" for m in months) + ")"
+                info_ok = True
+                known = count_known_fingerprints(batch_ids)
+                if known:
+                    info += f". {known} linhas já foram importadas antes e serão ignoradas"
+                cross_matches = find_cross_profile_matches(batch_ids, profile)
+        elif import_job["status"] == "failed":
+            errors = import_job["errors"]
+        else:
+            status_url = url_for("import_job_status", job_id=import_job["job_id"])
+            done_url = f"{url_for('gastos')}?Ano={selected_year}&Mes={selected_month}&job={import_job['job_id']}"
+            job_block = f"""
+              <div class="card" id="importJob" data-status-url="{status_url}" data-done-url="{done_url}">
+                <h3>Importando {escape(_normalize_str(import_job["filename"]))}</h3>
+                <p class="muted">Arquivo grande, processando em segundo plano. Esta tela atualiza sozinha.</p>
+                <div class="warnBox">Status: <b id="jobStatus">{IMPORT_JOB_STATUS_LABELS.get(import_job["status"], import_job["status"])}</b></div>
+                <div class="kpi" style="margin-top:12px;">
+                  <div class="box"><div class="label">Linhas lidas</div><div class="value" id="jobParsed">{import_job["parsed"]}</div></div>
+                  <div class="box"><div class="label">Validadas</div><div class="value" id="jobValidated">{import_job["validated"]}</div></div>
+                  <div class="box"><div class="label">Gravadas</div><div class="value" id="jobInserted">{import_job["inserted"]}</div></div>
+                </div>
+              </div>
+              <script>
+                (function () {{
+                  const box = document.getElementById("importJob");
+                  const labels = {json.dumps(IMPORT_JOB_STATUS_LABELS, ensure_ascii=False)};
+                  async function poll() {{
+                    try {{
+                      const res = await fetch(box.dataset.statusUrl, {{ credentials: "same-origin" }});
+                      if (!res.ok) {{
+                        // job sumiu (varredura) ou perfil trocou: para de perguntar
+                        document.getElementById("jobStatus").textContent = "Importação não encontrada, envie o arquivo de novo";
+                        return;
+                      }}
+                      const job = await res.json();
+                      if (!(job.status in labels)) {{
+                        document.getElementById("jobStatus").textContent = job.status || "Status desconhecido";
+                        return;
+                      }}
+                      document.getElementById("jobStatus").textContent = labels[job.status];
+                      document.getElementById("jobParsed").textContent = job.parsed;
+                      document.getElementById("jobValidated").textContent = job.validated;
+                      document.getElementById("jobInserted").textContent = job.inserted;
+                      if (job.status === "done" || job.status === "failed") {{
+                        window.location.href = box.dataset.doneUrl;
+                        return;
+                      }}
+                    }} catch (e) {{}}
+                    setTimeout(poll, 1000);
+                  }}
+                  setTimeout(poll, 1000);
+                }})();
+              </script>
+            """
 
     err_block = ""
     if errors:
-        items = "".join([f"<li>{e}</li>" for e in errors[:50]])
+        items = "".join([f"<li>{e}</li>" for e in errors[:TEMPLATE_ERRORS_SHOWN]])
         err_block = f"""
           <div class="card">
             <h3>Erros</h3>
@@ -1717,6 +3860,30 @@ def gastos():
               </tr>
             """
 
+        matches_block = ""
+        if cross_matches:
+            match_rows = ""
+            for m in cross_matches:
+                match_rows += f"""
+                  <tr>
+                    <td class="small">{_normalize_str(m["data"])}</td>
+                    <td class="small">{_normalize_str(m["descricao"])}</td>
+                    <td class="small">{m["other_profile"]}: {_normalize_str(m["other_descricao"])} <span class="muted">{_normalize_str(m["other_data"])}</span></td>
+                    <td class="right">{brl(m["valor"])}</td>
+                    <td class="right">{pct(m["score"])}</td>
+                  </tr>
+                """
+            matches_block = f"""
+              <div class="warnBox" style="margin-top:12px;">
+                <b>{len(cross_matches)} possíveis duplicados com lançamentos do outro perfil</b>
+                <div class="muted">Mesmo mês e valor, datas próximas e descrição parecida. Confira antes de importar; se for o mesmo gasto, exclua um dos dois depois em Lançamentos.</div>
+                <table>
+                  <thead><tr><th>Data</th><th>Sua descrição</th><th>Lançado pelo outro</th><th class="right">Valor</th><th class="right">Semelhança</th></tr></thead>
+                  <tbody>{match_rows}</tbody>
+                </table>
+              </div>
+            """
+
         preview_table = f"""
           <div class="card">
             <h3>Preview do Template</h3>
@@ -1732,8 +3899,9 @@ def gastos():
                   <a class="btn" href="{url_for('lancamentos')}?Ano={selected_year}&Mes={selected_month}">Ir para lançamentos</a>
                 </div>
               </form>
-              <p class="muted" style="margin-top:10px;">Se você não importar, esse batch fica como preview e pode ser excluído em Lançamentos.</p>
+              <p class="muted" style="margin-top:10px;">Se você não importar, esse batch fica como preview por {PREVIEW_TTL_HOURS:g}h e depois é descartado (ou exclua em Lançamentos).</p>
             </div>
+            {matches_block}
             <table>
               <thead><tr>{head}</tr></thead>
               <tbody>{body_rows}</tbody>
@@ -1775,6 +3943,7 @@ def gastos():
           </div>
 
           {locked_block}
+          {job_block}
           {err_block}
           {info_block}
 
@@ -1837,12 +4006,27 @@ def gastos():
               <input type="hidden" name="Ano" value="{selected_year}">
               <input type="hidden" name="Mes" value="{selected_month}">
               <input type="hidden" name="action" value="excel_preview">
+              <label style="font-weight:600;"><input type="checkbox" name="split_by_date" value="1" /> Separar por mês usando a coluna Data (linhas sem data ficam em {month_ref})</label>
               <label>Arquivo</label>
               <input id="fileInput" type="file" name="file" accept=".xlsx" />
               <p class="muted">Colunas obrigatórias: {", ".join(TEMPLATE_REQUIRED_COLUMNS)} (aba Template)</p>
             </form>
           </div>
 
+          <div class="card">
+            <h3>Importar vários meses (XLSX)</h3>
+            <p class="muted">Para backfill: selecione vários arquivos com o mês no nome (ex: <span class="mono">fatura_2024-03.xlsx</span>). Arquivos sem mês no nome vão para {month_ref}. Importa direto, sem preview.</p>
+            <form method="post" action="{url_for('gastos_bulk')}" enctype="multipart/form-data">
+              <input type="hidden" name="Ano" value="{selected_year}">
+              <input type="hidden" name="Mes" value="{selected_month}">
+              <label>Arquivos</label>
+              <input type="file" name="files" accept=".xlsx" multiple />
+              <div class="row" style="justify-content:flex-start; margin-top:12px;">
+                <button class="btn btnPrimary" type="submit">Importar todos</button>
+              </div>
+            </form>
+          </div>
+
           {preview_table}
         </div>
 
@@ -1860,6 +4044,89 @@ def gastos():
       </body>
     </html>
     """
+    return with_etag(html, etag)
+
+
+@app.post("/gastos/bulk")
+def gastos_bulk():
+    profile = session.get("profile", "")
+    if not profile:
+        return redirect(url_for("home"))
+
+    now_y, now_m = current_year_month()
+    selected_year = request.values.get("Ano") or str(now_y)
+    selected_month = request.values.get("Mes") or f"{now_m:02d}"
+    month_ref = month_ref_from(selected_year, selected_month)
+
+    files = [(f.filename, f.read()) for f in request.files.getlist("files") if f and f.filename.strip()]
+    errors = []
+    results = []
+    if not files:
+        errors.append("Selecione pelo menos um arquivo")
+    else:
+        try:
+            results = bulk_import_files(files, profile, month_ref)
+        except Exception as e:
+            errors.append(str(e))
+
+    err_block = ""
+    if errors:
+        items = "".join([f"<li>{e}</li>" for e in errors])
+        err_block = f"""
+          <div class="card">
+            <div class="errorBox"><ul>{items}</ul></div>
+          </div>
+        """
+
+    rows_html = ""
+    for r in results:
+        detail = "<br/>".join(r["errors"][:5])
+        rows_html += f"""
+          <tr>
+            <td class="small">{_normalize_str(r["filename"])}</td>
+            <td class="mono">{r["month_ref"] or "-"}</td>
+            <td>{BULK_STATUS_LABELS[r["status"]]}</td>
+            <td class="right">{r["rows"]}</td>
+            <td class="right">{r["skipped"]}</td>
+            <td class="small">{detail}</td>
+          </tr>
+        """
+    imported = sum(1 for r in results if r["status"] == "imported")
+
+    html = f"""
+    <!doctype html>
+    <html lang="pt-br">
+      <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1">
+        <title>Importar vários meses</title>
+        {BASE_CSS}
+      </head>
+      <body>
+        {topbar_html(profile)}
+        <div class="wrap">
+          <div class="card">
+            <h2>Importar vários meses</h2>
+            <p class="muted">{imported} de {len(results)} arquivos importados.</p>
+            <div class="row" style="justify-content:flex-start; margin-top:12px;">
+              <a class="btn btnPrimary" href="{url_for('gastos')}?Ano={selected_year}&Mes={selected_month}">Voltar para Gastos</a>
+              <a class="btn" href="{url_for('lancamentos')}?Ano={selected_year}&Mes={selected_month}">Lançamentos</a>
+            </div>
+          </div>
+
+          {err_block}
+
+          <div class="card">
+            <h3>Arquivos</h3>
+            <table>
+              <thead><tr><th>Arquivo</th><th>Mês</th><th>Status</th><th class="right">Linhas</th><th class="right">Repetidas</th><th>Erros</th></tr></thead>
+              <tbody>{rows_html or "<tr><td colspan='6' class='muted'>Nenhum arquivo</td></tr>"}</tbody>
+            </table>
+          </div>
+        </div>
+      </body>
+    </html>
+    """
     return html
 
 
@@ -1874,6 +4141,11 @@ def lancamentos():
     selected_month = request.values.get("Mes") or f"{now_m:02d}"
     month_ref = month_ref_from(selected_year, selected_month)
 
+    etag = month_page_etag(month_ref, profile)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
     ensure_fixed_rows(month_ref)
 
     filter_profile = request.values.get("filter_profile") or "Todos"
@@ -1933,7 +4205,6 @@ def lancamentos():
       ORDER BY created_at DESC
     """, (month_ref,))
     batches = cur.fetchall()
-    conn.close()
 
     for b in batches:
         can_del_batch = (b["uploaded_by"] == profile) or (b["uploaded_by"] == "system")
@@ -2062,6 +4333,139 @@ def lancamentos():
       </body>
     </html>
     """
+    return with_etag(html, etag)
+
+
+@app.route("/busca", methods=["GET"])
+def busca():
+    profile = session.get("profile", "")
+    if not profile:
+        return redirect(url_for("home"))
+
+    q = (request.args.get("q") or "").strip()
+    filter_profile = request.args.get("filter_profile") or "Todos"
+    categoria = request.args.get("categoria") or ""
+    if categoria not in ALLOWED_CATEGORIAS:
+        categoria = ""
+    min_raw = (request.args.get("min") or "").strip()
+    max_raw = (request.args.get("max") or "").strip()
+    # mesmo formato dos formulários de valor: "1.234,56"
+    min_valor = _to_float_or_none(min_raw.replace(".", "").replace(",", ".")) if min_raw else None
+    max_valor = _to_float_or_none(max_raw.replace(".", "").replace(",", ".")) if max_raw else None
+    after = request.args.get("after") or ""
+
+    rows, next_cursor = search_transactions(
+        q,
+        uploaded_by=filter_profile if filter_profile in ("Lucas", "Rafa") else "",
+        categoria=categoria,
+        min_valor=min_valor,
+        max_valor=max_valor,
+        after=after,
+    )
+
+    row_html = ""
+    for r in rows:
+        month_ref = r["month_ref"]
+        ano, mes = month_ref[:4], month_ref[4:]
+        row_html += f"""
+          <tr>
+            <td class="small"><a href="{url_for('lancamentos')}?Ano={escape(ano)}&Mes={escape(mes)}">{escape(mes)}/{escape(ano)}</a></td>
+            <td class="small">{escape(_normalize_str(r['dt_text']))}</td>
+            <td>{escape(_normalize_str(r['uploaded_by']))}</td>
+            <td class="small">{escape(_normalize_str(r['descricao']))}</td>
+            <td class="small">{escape(_normalize_str(r['categoria']))}</td>
+            <td class="small">{escape(_normalize_str(r['dono']))}</td>
+            <td class="small">{escape(_normalize_str(r['observacao']))}</td>
+            <td class="right">{brl(signed_value(r['tipo'], r['valor']))}</td>
+          </tr>
+        """
+    if not row_html:
+        empty = "Nada encontrado" if q else "Digite um termo para buscar em todos os meses"
+        row_html = f"<tr><td colspan='8' class='muted'>{empty}</td></tr>"
+
+    pager = ""
+    if next_cursor:
+        next_args = {k: v for k, v in request.args.items() if k != "after"}
+        next_args["after"] = next_cursor
+        pager = f"""
+          <div class="row" style="justify-content:flex-start; margin-top:12px;">
+            <a class="btn" href="{url_for('busca', **next_args)}">Próxima página</a>
+          </div>
+        """
+
+    profile_opts = ""
+    for opt in ["Todos", "Lucas", "Rafa"]:
+        sel = "selected" if opt == filter_profile else ""
+        profile_opts += f"<option value='{opt}' {sel}>{opt}</option>"
+    categoria_opts = "<option value=''>Todas</option>" + "".join([
+        f"<option value='{c}' {'selected' if c == categoria else ''}>{c}</option>"
+        for c in sorted(ALLOWED_CATEGORIAS)
+    ])
+
+    html = f"""
+    <!doctype html>
+    <html lang="pt-br">
+      <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1">
+        <title>Busca</title>
+        {BASE_CSS}
+      </head>
+      <body>
+        {topbar_html(profile)}
+        <div class="wrap">
+          <div class="card">
+            <h2>Busca</h2>
+            <p class="muted">Procura em descrição, categoria e observação de todos os meses (sem diferenciar acentos).</p>
+            <form method="get">
+              <label>Termo</label>
+              <input type="text" name="q" value="{escape(q)}" placeholder="ex: veterinário">
+              <div class="grid3" style="margin-top:10px;">
+                <div>
+                  <label>Uploader</label>
+                  <select name="filter_profile">{profile_opts}</select>
+                </div>
+                <div>
+                  <label>Categoria</label>
+                  <select name="categoria">{categoria_opts}</select>
+                </div>
+                <div>
+                  <label>Valor entre</label>
+                  <div class="row" style="justify-content:flex-start;">
+                    <input type="text" name="min" value="{escape(min_raw)}" placeholder="mín">
+                    <input type="text" name="max" value="{escape(max_raw)}" placeholder="máx">
+                  </div>
+                </div>
+              </div>
+              <div class="row" style="justify-content:flex-start; margin-top:12px;">
+                <button class="btn btnPrimary" type="submit">Buscar</button>
+              </div>
+            </form>
+          </div>
+
+          <div class="card">
+            <h3>Resultados</h3>
+            <table>
+              <thead>
+                <tr>
+                  <th>Mês</th>
+                  <th>Data</th>
+                  <th>Uploader</th>
+                  <th>Descrição</th>
+                  <th>Categoria</th>
+                  <th>Dono</th>
+                  <th>Obs</th>
+                  <th class="right">Valor</th>
+                </tr>
+              </thead>
+              <tbody>{row_html}</tbody>
+            </table>
+            {pager}
+          </div>
+        </div>
+      </body>
+    </html>
+    """
     return html
 
 
@@ -2074,24 +4478,23 @@ def casa():
     now_y, now_m = current_year_month()
     month_ref = request.args.get("month_ref") or f"{now_y}{now_m:02d}"
 
+    etag = month_page_etag(month_ref, profile)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
     ensure_fixed_rows(month_ref)
 
-    data = compute_casa(month_ref)
+    # mês fechado e dados sem mudança desde então: direto do snapshot
+    snap = get_month_snapshot(month_ref, profile)
+    if snap:
+        data = snap["casa"]
+        cats_rows = snap["casa_rows_html"]
+    else:
+        data = compute_casa(month_ref)
+        cats_rows = casa_category_rows_html(data)
     settle_line = f"{data['settlement_text']}: {brl(data['settlement_value'])}"
 
-    cats_rows = ""
-    for cat, obj in data["cats_sorted"]:
-        cats_rows += f"""
-          <tr>
-            <td>{cat}</td>
-            <td class="right">{brl(obj["total"])}</td>
-            <td class="right">{brl(obj["lucas"])}</td>
-            <td class="right">{brl(obj["rafa"])}</td>
-          </tr>
-        """
-    if not cats_rows:
-        cats_rows = "<tr><td colspan='4' class='muted'>Sem lançamentos de Casa para esse mês</td></tr>"
-
     html = f"""
     <!doctype html>
     <html lang="pt-br">
@@ -2168,7 +4571,41 @@ def casa():
       </body>
     </html>
     """
-    return html
+    return with_etag(html, etag)
+
+
+with app.app_context():
+    init_db()
+
+
+# =========================
+# Boot report
+# =========================
+def current_rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em bytes no macOS e em KiB no Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+BOOT_STATS = {
+    "import_seconds": time.perf_counter() - _BOOT_STARTED,
+    "rss_mib": current_rss_mib(),
+    "openpyxl_loaded": "openpyxl" in sys.modules,
+}
+app.logger.info(
+    "Boot pid %d: app importado em %.3fs, RSS %.1f MiB, openpyxl carregado: %s",
+    os.getpid(), BOOT_STATS["import_seconds"], BOOT_STATS["rss_mib"], BOOT_STATS["openpyxl_loaded"],
+)
 
 
 if __name__ == "__main__":